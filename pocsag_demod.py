@@ -74,6 +74,7 @@ class pocsag_demod(gr.top_block, Qt.QWidget):
         self.udp_port = udp_port = 5125
         self.symbol_rate_2 = symbol_rate_2 = 1200
         self.symbol_rate = symbol_rate = 1200
+        self.soft_udp_port = soft_udp_port = 5126
         self.samp_rate = samp_rate = 1.8e6
         self.ip_addr = ip_addr = "127.0.0.1"
         self.fsk_deviation_hz = fsk_deviation_hz = 2.5e3
@@ -235,8 +236,9 @@ class pocsag_demod(gr.top_block, Qt.QWidget):
         self.freq_xlating_fir_filter_xxx_0 = filter.freq_xlating_fir_filter_ccc(decimation, (firdes.low_pass(5, samp_rate, fsk_deviation_hz,fsk_deviation_hz*2)), 0, samp_rate)
         self.digital_clock_recovery_mm_xx_0 = digital.clock_recovery_mm_ff(samp_rate/(decimation*symbol_rate)*(1+0.0), 0.01, 0, 0.1, 0.01)
         self.digital_binary_slicer_fb_0 = digital.binary_slicer_fb()
-        self.blocks_udp_sink_0 = blocks.udp_sink(gr.sizeof_char*1472, ip_addr, udp_port, 1472, True)
-        self.blocks_stream_to_vector_0 = blocks.stream_to_vector(gr.sizeof_char*1, 1472)
+        self.blocks_unpacked_to_packed_xx_0 = blocks.unpacked_to_packed_bb(1, gr.GR_MSB_FIRST)
+        self.blocks_udp_sink_0 = blocks.udp_sink(gr.sizeof_char*184, ip_addr, udp_port, 184, True)
+        self.blocks_stream_to_vector_0 = blocks.stream_to_vector(gr.sizeof_char*1, 184)
         self.analog_quadrature_demod_cf_0 = analog.quadrature_demod_cf(samp_rate/(2*math.pi*fsk_deviation_hz/8.0))
 
         ##################################################
@@ -245,7 +247,8 @@ class pocsag_demod(gr.top_block, Qt.QWidget):
         self.connect((self.analog_quadrature_demod_cf_0, 0), (self.qtgui_time_sink_x_0, 0))
         self.connect((self.analog_quadrature_demod_cf_0, 0), (self.root_raised_cosine_filter_0, 0))
         self.connect((self.blocks_stream_to_vector_0, 0), (self.blocks_udp_sink_0, 0))
-        self.connect((self.digital_binary_slicer_fb_0, 0), (self.blocks_stream_to_vector_0, 0))
+        self.connect((self.blocks_unpacked_to_packed_xx_0, 0), (self.blocks_stream_to_vector_0, 0))
+        self.connect((self.digital_binary_slicer_fb_0, 0), (self.blocks_unpacked_to_packed_xx_0, 0))
         self.connect((self.digital_clock_recovery_mm_xx_0, 0), (self.digital_binary_slicer_fb_0, 0))
         self.connect((self.freq_xlating_fir_filter_xxx_0, 0), (self.analog_quadrature_demod_cf_0, 0))
         self.connect((self.freq_xlating_fir_filter_xxx_0, 0), (self.qtgui_const_sink_x_0, 0))
@@ -278,6 +281,12 @@ class pocsag_demod(gr.top_block, Qt.QWidget):
         self.root_raised_cosine_filter_0.set_taps(firdes.root_raised_cosine(1, self.samp_rate/self.decimation, self.symbol_rate, 0.35, 45))
         self.digital_clock_recovery_mm_xx_0.set_omega(self.samp_rate/(self.decimation*self.symbol_rate)*(1+0.0))
 
+    def get_soft_udp_port(self):
+        return self.soft_udp_port
+
+    def set_soft_udp_port(self, soft_udp_port):
+        self.soft_udp_port = soft_udp_port
+
     def get_samp_rate(self):
         return self.samp_rate
 
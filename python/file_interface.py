@@ -0,0 +1,77 @@
+"""
+    Module with functions to read a capture file the same way
+    UdpInterface reads the UDP sink, so the reader can decode
+    files with the same streaming loop it uses for the network
+
+    The file is memory mapped and read CHUNK_SIZE bits at a time
+    into a fixed size RingBuffer, so memory stays bounded however
+    big the capture is and messages come out as soon as their
+    batches have been read. Bits that are still needed (the end of
+    an FSC or a run of batches) stay in the buffer across chunks,
+    so nothing that spans a chunk boundary is lost.
+
+    Packed captures (8 bits per byte) are unpacked as they're read,
+    see udp_interface.make_unpack_table
+"""
+import mmap
+from ring_buffer import RingBuffer
+from udp_interface import BUFFER_SIZE, INVERT_TABLE, make_unpack_table, unpack_bits
+
+CHUNK_SIZE = 1 << 16  # bits per read
+
+
+class FileInterface(object):
+    def __init__(self, file_name, chunk_size=CHUNK_SIZE, buffer_size=BUFFER_SIZE,
+                 packed=False, bit_order="msb"):
+        self.file_name = file_name
+        # None when the file is one bit per byte
+        self.unpack_table = make_unpack_table(bit_order) if packed else None
+        self.chunk_size = chunk_size // 8 if packed else chunk_size  # bytes per read
+        self.file = open(file_name, mode='rb')
+        self.data = self._map_file()
+        self.pos = 0  # next byte of the file to read
+        self.buffer = RingBuffer(buffer_size)
+
+    def _map_file(self):
+        """
+            memory map the whole file read only
+            returns an empty str for an empty file since those can't be mapped
+        """
+        try:
+            return mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return ""
+
+    def read_socket(self):
+        """
+            read the next chunk of the file into buffer
+            named to match UdpInterface
+
+            returns:
+                (bool) False if the whole file has already been read
+        """
+        if self.pos >= len(self.data):
+            return False
+
+        chunk = self.data[self.pos: self.pos + self.chunk_size]
+        self.pos += len(chunk)
+
+        # flip bit since high freq is logical 0 and low freq is logical 1
+        if self.unpack_table is not None:
+            self.buffer.write(unpack_bits(chunk, self.unpack_table))
+        else:
+            self.buffer.write(bytearray(chunk.translate(INVERT_TABLE)))
+        return True
+
+    def clean_buffer(self, last_idx):
+        """
+            remove data that is no longer useful in the buffer
+            everything before last_idx is dropped
+        """
+        self.buffer.consume(last_idx)
+
+    def close(self):
+        """close the map and the file"""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
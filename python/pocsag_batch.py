@@ -13,67 +13,124 @@
 
     There can be many concurrent batches depending on the
     length of the message
+
+    A batch is held as 17 32 bit int words (the FSC then the 16 codewords)
 """
 from pocsag_frame import PocsagFrame
-FRAME_SYNC_CODE = "01111100110100100001010111011000"
+from pocsag_bch import popcount
+FRAME_SYNC_CODE = 0x7CD215D8  # 01111100110100100001010111011000
+BATCH_WORDS = 17
+
+
+def bits_to_words(bits):
+    """
+        Pack bits into 32 bit int words, MSB first
+        Any trailing bits that don't make a full word are dropped
+
+        args:
+            bits - (int[]) of 0/1 bits
+        returns:
+            (int[]) of the words
+    """
+    words = []
+    for idx in range(0, len(bits) - 31, 32):
+        word = 0
+        for bit in bits[idx: idx + 32]:
+            word = (word << 1) | bit
+        words.append(word)
+    return words
+
+
+def fsc_errors(word):
+    """
+        Hamming distance between a word and the FSC
+
+        args:
+            word - (int) 32 bit word
+        returns:
+            (int) number of bits that differ from FRAME_SYNC_CODE
+    """
+    return popcount(word ^ FRAME_SYNC_CODE)
 
 
 class PocsagBatch(object):
     """
         args:
-            batch - (str) of len 544 bits (32 * 16 + 32)
+            batch - (int[]) of len 17 words (FSC + 16 codewords)
+            max_errors - (int) number of bit errors allowed in the FSC
     """
+    __slots__ = ("batch", "max_errors", "is_valid", "_errors", "_frames")
 
-    def __init__(self, batch):
+    def __init__(self, batch, max_errors=0):
         self.batch = batch
+        self.max_errors = max_errors
         self.is_valid = self._is_valid(batch)
-        self.frames = []
+        self._errors = None
+        self._frames = []
 
     def _is_valid(self, batch):
         """
             Method to determine if it is a valid batch
             Will check length and the existance of an FSC at the beginning
+            The FSC can be off by up to self.max_errors bits
 
             args:
-                batch - (str) the batch of bits
+                batch - (int[]) the batch of words
             returns:
                 (bool) identifying validity
         """
-        # print batch[0:32]
-        if len(batch) != 544:
+        if len(batch) != BATCH_WORDS:
             print "invalid batch len"
             return False
-        elif batch[0:32] != FRAME_SYNC_CODE:
-            # print "invalid FSC", batch[0:32], '{0:b}'.format(int(
-            #     batch[0:32], 2) >> 1 ^ int(FRAME_SYNC_CODE, 2))
+        elif fsc_errors(batch[0]) > self.max_errors:
             return False
         else:
             return True
 
-    def parse_frames(self):
+    def parse_frames(self, errors=None):
         """
             Method to parse frames into self.frames as PocsagFrame objects
+
+            The frames aren't made until self.frames is read
+
+            args:
+                errors - (int[]) if the 16 codewords were already BCH corrected,
+                    the number of bits fixed in each
         """
-        idx = 32  # start at bit 33, after fsc
-        frame_pos = 0
-        while idx < len(self.batch):
-            frame_bits = self.batch[idx: idx + 64]
-            frame = PocsagFrame(frame_bits, frame_pos)
-            frame.get_codewords()
+        self._errors = errors
+        self._frames = None
+
+    @property
+    def frames(self):
+        """(PocsagFrame[]) the 8 frames, made the first time they're needed"""
+        if self._frames is None:
+            frames = []
+            idx = 1  # start at word 2, after fsc
+            frame_pos = 0
+            while idx < len(self.batch):
+                frame = PocsagFrame(self.batch[idx: idx + 2], frame_pos)
+                if self._errors is None:
+                    frame.get_codewords()
+                else:
+                    frame.get_codewords(self._errors[idx - 1: idx + 1])
 
-            self.frames.append(frame)
-            idx += 64
-            frame_pos += 1
+                frames.append(frame)
+                idx += 2
+                frame_pos += 1
+            self._frames = frames
+        return self._frames
 
 
-def contains_fsc(bits):
+def contains_fsc(bits, max_errors=0):
     """
         Function to determine if a bitstring contains the fsc
         at the beginning
 
         args:
-            bits - (str) of the bits
+            bits - (int[]) of 0/1 bits
+            max_errors - (int) number of bit errors allowed in the FSC
         returns:
             (bool) of whether it has the fsc at the beginning
     """
-    return bits[0:32] == FRAME_SYNC_CODE
+    words = bits_to_words(bits[0:32])
+    return len(words) == 1 and fsc_errors(words[0]) <= max_errors
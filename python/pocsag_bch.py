@@ -0,0 +1,141 @@
+"""
+    Module for the BCH(31,21) code that protects every codeword
+
+    | ++++++++++++++++++++++++++++++++++++++++ |
+    | 1 - 21       | 22 - 31      | 32         |
+    | data bits    | bch check    | parity     |
+    | ++++++++++++++++++++++++++++++++++++++++ |
+
+    The first 31 bits are a BCH(31,21) codeword with generator
+    x^10 + x^9 + x^8 + x^6 + x^5 + x^3 + 1, and bit 32 makes the
+    whole word even parity.
+
+    The syndrome is the remainder of the 31 bit codeword divided by
+    the generator. It's 0 for a good codeword, and every 1 or 2 bit
+    error gives a different syndrome, so a table from syndrome to
+    error pattern corrects those in one lookup.
+"""
+GENERATOR = 0x769  # x^10 + x^9 + x^8 + x^6 + x^5 + x^3 + 1
+UNCORRECTABLE = -1
+
+# number of 1s in every 16 bit value, so a 32 bit popcount is 2 lookups
+POPCOUNT_16 = bytearray(bin(i).count("1") for i in range(1 << 16))
+
+
+def popcount(word):
+    """
+        Count the number of 1s in a codeword
+
+        args:
+            word - (int) 32 bit unsigned int
+        returns:
+            (int) number of set bits
+    """
+    return POPCOUNT_16[word & 0xFFFF] + POPCOUNT_16[word >> 16]
+
+
+def _poly_mod(value):
+    """
+        Remainder of value / GENERATOR over GF(2)
+
+        args:
+            value - (int) up to 31 bit polynomial
+        returns:
+            (int) 10 bit remainder
+    """
+    for i in range(30, 9, -1):
+        if value & (1 << i):
+            value ^= GENERATOR << (i - 10)
+    return value
+
+
+# the syndrome is linear, so split the 31 bit codeword into bytes
+# and XOR together the remainder of each byte in its position
+SYNDROME_TABLES = [[_poly_mod(byte << (8 * pos)) for byte in range(256)]
+                   for pos in range(4)]
+
+
+def syndrome(word):
+    """
+        BCH syndrome of a codeword, ignores the parity bit
+
+        args:
+            word - (int) 32 bit codeword
+        returns:
+            (int) 10 bit syndrome, 0 if there are no detectable errors
+    """
+    code = word >> 1
+    return (SYNDROME_TABLES[0][code & 0xFF] ^
+            SYNDROME_TABLES[1][(code >> 8) & 0xFF] ^
+            SYNDROME_TABLES[2][(code >> 16) & 0xFF] ^
+            SYNDROME_TABLES[3][code >> 24])
+
+
+def _build_error_patterns():
+    """
+        Make the syndrome -> error pattern table for every 1 and 2 bit
+        error in the 31 BCH bits. Patterns are shifted to line up with
+        the 32 bit codeword (so they skip the parity bit)
+
+        returns:
+            (dict) of syndrome -> error pattern
+    """
+    patterns = {}
+    for i in range(1, 32):
+        patterns[syndrome(1 << i)] = 1 << i
+        for j in range(i + 1, 32):
+            patterns[syndrome((1 << i) | (1 << j))] = (1 << i) | (1 << j)
+    return patterns
+
+
+ERROR_PATTERNS = _build_error_patterns()
+
+
+def encode(data):
+    """
+        Make a full codeword from 21 data bits
+
+        args:
+            data - (int) 21 bits, the id bit and address/function or msg bits
+        returns:
+            (int) 32 bit codeword with bch check and parity bits filled in
+    """
+    code = (data << 10) | _poly_mod(data << 10)
+    word = code << 1
+    return word | (popcount(word) & 1)
+
+
+def correct(word):
+    """
+        Correct up to 2 bit errors in a codeword
+
+        Fixes the BCH bits with ERROR_PATTERNS, then uses the parity bit
+        to catch a second error when only 1 was fixed, or a third one
+        that the BCH code can't see.
+
+        args:
+            word - (int) 32 bit codeword as received
+        returns:
+            (int, int) of the corrected word and the number of bits fixed.
+            if it can't be corrected, the word is returned as is
+            and the number of bits is UNCORRECTABLE
+    """
+    syn = syndrome(word)
+    if syn == 0:
+        if popcount(word) & 1:
+            # only the parity bit is off
+            return word ^ 1, 1
+        return word, 0
+
+    pattern = ERROR_PATTERNS.get(syn)
+    if pattern is None:
+        return word, UNCORRECTABLE
+
+    fixed = word ^ pattern
+    errors = popcount(pattern)
+    if popcount(fixed) & 1:
+        if errors == 1:
+            # the other error was the parity bit
+            return fixed ^ 1, 2
+        return word, UNCORRECTABLE
+    return fixed, errors
@@ -0,0 +1,353 @@
+"""
+    Program to benchmark each stage of the decoder
+
+    Fixed corpora are made with pocsag_encoder from a fixed seed, so the
+    same bits are decoded every run and results can be compared across
+    commits. The corpora are
+
+    - idle_noise: random bits with no transmissions in them
+    - dense: back to back transmissions full of short pages
+    - long: transmissions of long alphanum messages
+    - high_ber: dense traffic with bit errors, decoded with FSC errors
+      allowed and no preamble needed
+
+    and each stage is timed on its own, taking the best of REPEATS runs
+
+    - sync: SyncDetector searching every bit outside the batches
+    - group_batches: slicing runs of bits into PocsagBatch objects
+    - parse_frames: making the frames and BCH correcting the codewords
+    - assemble: assemble_messages putting codewords into messages
+    - decode_alphanum / decode_bcd: decoding every message as that type
+    - decode_auto: working out the type and decoding (message_out)
+    - numpy_batches: pocsag_numpy finding and correcting every batch,
+      only if numpy is installed
+    - stream: PocsagDecoder fed PAYLOAD_SIZE chunks like the network path,
+      decoding each message as it comes out. The time from a chunk being
+      fed in to its messages being decoded is the per message latency
+
+    One JSON object is printed per corpus with bits/s and messages/s for
+    every stage (over the whole corpus), the latencies, the peak RSS of
+    the process so far and the git commit, so results can be saved and
+    compared across commits
+"""
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import timeit
+
+from pocsag_batch import contains_fsc
+from pocsag_decoder import PocsagDecoder
+from pocsag_encoder import Page, encode_transmission, random_pages, random_bits, add_bit_errors
+from pocsag_reader import group_batches, assemble_messages, BATCH_SIZE, PAYLOAD_SIZE
+from pocsag_sync import SyncDetector
+
+try:
+    import numpy as np
+    import pocsag_numpy
+except ImportError:
+    pocsag_numpy = None
+
+CORPUS_BITS = 1 << 21  # about 30 minutes at 1200 Bd
+CORPORA = ["idle_noise", "dense", "long", "high_ber"]
+HIGH_BER = 1e-3
+HIGH_BER_FSC_ERRORS = 2
+REPEATS = 3
+SEED = 1
+
+timer = timeit.default_timer
+
+
+class Corpus(object):
+    """
+        Bits to benchmark on and how to decode them
+
+        args:
+            name - (str) one of CORPORA
+            bits - (bytearray) of 0/1 bits, already flipped like the reader sees them
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+    """
+
+    def __init__(self, name, bits, max_errors=0, require_preamble=True):
+        self.name = name
+        self.bits = bits
+        self.max_errors = max_errors
+        self.require_preamble = require_preamble
+
+
+def main():
+    """Main method"""
+    for name in CORPORA:
+        print json.dumps(run_corpus(make_corpus(name)), sort_keys=True)
+
+
+def make_corpus(name, num_bits=CORPUS_BITS, seed=SEED):
+    """
+        Make one of the fixed corpora
+
+        args:
+            name - (str) one of CORPORA
+            num_bits - (int) roughly how many bits to make
+            seed - (int) seed for the random pages and noise
+        returns:
+            (Corpus)
+    """
+    if name not in CORPORA:
+        raise ValueError("unknown corpus %r" % name)
+
+    rnd = random.Random(seed)
+    if name == "idle_noise":
+        return Corpus(name, random_bits(num_bits, rnd))
+
+    bits = bytearray()
+    while len(bits) < num_bits:
+        if name == "long":
+            pages = [Page(rnd.getrandbits(21),
+                          "".join(chr(rnd.randint(32, 126)) for _ in range(rnd.randint(400, 1000))))
+                     for _ in range(2)]
+            bits += random_bits(rnd.randint(0, 2000), rnd)
+        else:
+            pages = random_pages(8, rnd)
+            bits += random_bits(rnd.randint(0, 64), rnd)
+        bits += encode_transmission(pages)
+
+    if name == "high_ber":
+        add_bit_errors(bits, HIGH_BER, rnd)
+        return Corpus(name, bits, HIGH_BER_FSC_ERRORS, False)
+    return Corpus(name, bits)
+
+
+def find_runs(corpus):
+    """
+        Find the offset and length of every run of batches
+        the same way decode_stream does, to set up the stage timings
+
+        args:
+            corpus - (Corpus)
+        returns:
+            (dict) of run offset -> number of batches
+    """
+    bits = corpus.bits
+    detector = SyncDetector(max_errors=corpus.max_errors,
+                            require_preamble=corpus.require_preamble)
+    runs = {}
+    idx = 0
+    while True:
+        offset = detector.find(bits, idx)
+        if offset is None:
+            return runs
+
+        num_batches = 0
+        while offset + (num_batches + 1) * BATCH_SIZE <= len(bits) and contains_fsc(
+                bits[offset + num_batches * BATCH_SIZE: offset + num_batches * BATCH_SIZE + 32],
+                corpus.max_errors):
+            num_batches += 1
+
+        if num_batches:
+            runs[offset] = num_batches
+            idx = offset + BATCH_SIZE * num_batches
+            detector.reset()
+        else:
+            idx = offset + 32
+
+
+def time_sync(corpus, runs):
+    """
+        Time the sync search on its own, jumping over
+        the runs of batches that were already found
+
+        returns:
+            (float) seconds
+    """
+    bits = corpus.bits
+    detector = SyncDetector(max_errors=corpus.max_errors,
+                            require_preamble=corpus.require_preamble)
+    started = timer()
+    idx = 0
+    while True:
+        offset = detector.find(bits, idx)
+        if offset is None:
+            break
+
+        num_batches = runs.get(offset)
+        if num_batches:
+            idx = offset + BATCH_SIZE * num_batches
+            detector.reset()
+        else:
+            idx = offset + 32
+    return timer() - started
+
+
+def time_stream(corpus):
+    """
+        Time PocsagDecoder on PAYLOAD_SIZE chunks, decoding messages as they come out
+
+        returns:
+            (float, float[]) of the seconds and the latency of every message
+    """
+    bits = corpus.bits
+    decoder = PocsagDecoder(corpus.max_errors, corpus.require_preamble)
+    latencies = []
+    started = timer()
+    for idx in range(0, len(bits), PAYLOAD_SIZE):
+        fed = timer()
+        messages = decoder.feed(bits[idx: idx + PAYLOAD_SIZE])
+        for message in messages:
+            message.message_out
+        if messages:
+            latency = timer() - fed
+            latencies.extend([latency] * len(messages))
+
+    fed = timer()
+    messages = decoder.flush()
+    for message in messages:
+        message.message_out
+    latencies.extend([timer() - fed] * len(messages))
+    return timer() - started, latencies
+
+
+def run_once(corpus, runs):
+    """
+        Time every stage once
+
+        returns:
+            (dict, int, float[]) of seconds per stage, number of
+            messages and the stream latencies
+    """
+    seconds = {}
+    seconds["sync"] = time_sync(corpus, runs)
+
+    offsets = sorted(runs)
+    started = timer()
+    transmissions = [group_batches(corpus.bits, offset, corpus.max_errors)
+                     for offset in offsets]
+    seconds["group_batches"] = timer() - started
+
+    started = timer()
+    for batches in transmissions:
+        for batch in batches:
+            for frame in batch.frames:
+                frame.codewords
+    seconds["parse_frames"] = timer() - started
+
+    started = timer()
+    messages = [message for batches in transmissions
+                for message in assemble_messages(batches)]
+    seconds["assemble"] = timer() - started
+
+    started = timer()
+    for message in messages:
+        message._decode_alphanum_message()
+    seconds["decode_alphanum"] = timer() - started
+
+    started = timer()
+    for message in messages:
+        message._decode_bcd_message()
+    seconds["decode_bcd"] = timer() - started
+
+    started = timer()
+    for message in messages:
+        message.message_out
+    seconds["decode_auto"] = timer() - started
+
+    if pocsag_numpy is not None:
+        started = timer()
+        bits = np.frombuffer(bytes(corpus.bits), dtype=np.uint8)
+        for _, batch_words in pocsag_numpy.find_transmissions(
+                bits, corpus.max_errors, corpus.require_preamble):
+            pocsag_numpy.make_batches(batch_words, corpus.max_errors)
+        seconds["numpy_batches"] = timer() - started
+
+    seconds["stream"], latencies = time_stream(corpus)
+    return seconds, len(messages), latencies
+
+
+def run_corpus(corpus, repeats=REPEATS):
+    """
+        Benchmark every stage on a corpus
+
+        args:
+            corpus - (Corpus)
+            repeats - (int) times to run each stage, the best is kept
+        returns:
+            (dict) of the results
+    """
+    runs = find_runs(corpus)
+
+    best = {}
+    latencies = []
+    num_messages = 0
+    for _ in range(repeats):
+        seconds, num_messages, run_latencies = run_once(corpus, runs)
+        for stage, value in seconds.items():
+            best[stage] = min(value, best.get(stage, value))
+        if not latencies or sum(run_latencies) < sum(latencies):
+            latencies = run_latencies
+
+    num_bits = len(corpus.bits)
+    stages = {}
+    for stage, value in best.items():
+        stages[stage] = {
+            "seconds": round(value, 6),
+            "bits_per_sec": round(num_bits / value) if value else None,
+            "messages_per_sec": round(num_messages / value) if value else None,
+        }
+
+    return {
+        "corpus": corpus.name,
+        "bits": num_bits,
+        "batches": sum(runs.values()),
+        "messages": num_messages,
+        "stages": stages,
+        "latency_ms": summarize(latencies),
+        # kB on linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": pocsag_numpy is not None,
+    }
+
+
+def summarize(latencies):
+    """
+        Mean and percentiles of the latencies
+
+        args:
+            latencies - (float[]) in seconds
+        returns:
+            (dict) in milliseconds, None if there weren't any
+    """
+    if not latencies:
+        return None
+
+    latencies = sorted(latencies)
+
+    def percentile(pct):
+        return round(1000 * latencies[min(len(latencies) - 1, int(pct * len(latencies)))], 3)
+
+    return {
+        "mean": round(1000 * sum(latencies) / len(latencies), 3),
+        "p50": percentile(0.5),
+        "p99": percentile(0.99),
+        "max": round(1000 * latencies[-1], 3),
+    }
+
+
+def git_commit():
+    """
+        returns:
+            (str) the commit being benchmarked, None outside a git checkout
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main()
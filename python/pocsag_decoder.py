@@ -0,0 +1,220 @@
+"""
+    Module with an incremental, push based POCSAG decoder
+
+    Bits are pushed in with feed() as they arrive, in chunks of any size,
+    and finished PocsagMessages come back as soon as they end (at an idle
+    codeword, the next address or the end of the batches). The decoder
+    keeps its sync, batch and message state between calls, so every bit
+    is looked at exactly once and nothing is buffered or re-scanned.
+
+    | +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+    | hunting: SyncDetector  -->  in batch: 32 bit words, 17 per batch |
+    |        ^                                        |                |
+    |        +------- word 0 of a batch isn't an FSC -+                |
+    | +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    That makes it easy to drive from any event loop, or from a GNU Radio
+    block's work function.
+"""
+from pocsag_batch import fsc_errors, BATCH_WORDS
+from pocsag_bch import correct, UNCORRECTABLE
+from pocsag_frame import make_codeword, PocsagAddressWord, PocsagIdleFrame
+from pocsag_message import PocsagMessage
+from pocsag_sync import SyncDetector
+
+# maps each 0/1 byte to "0"/"1" so 32 bits can be parsed with int(..., 2)
+BIT_CHARS = bytes(bytearray(ord("0") + (i & 1) for i in range(256)))
+
+
+class PocsagDecoder(object):
+    """
+        args:
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            subscriptions - (CapcodeFilter) only build messages to these capcodes,
+                None for every capcode
+    """
+
+    def __init__(self, max_errors=0, require_preamble=True, subscriptions=None):
+        self.max_errors = max_errors
+        self.subscriptions = subscriptions
+        self.detector = SyncDetector(max_errors=max_errors,
+                                     require_preamble=require_preamble)
+        self.in_batch = False
+        self.word = 0  # bits of the current word so far
+        self.word_bits = 0  # number of bits in self.word
+        self.word_idx = 0  # position of the current word in its batch, 0 is the FSC
+        self.word_end = 0  # index in the bits being fed just past the last full word
+        self.message = None  # PocsagMessage still being added to
+        self.bits = 0  # bits fed in
+        self.batches = 0  # batches decoded
+        self.messages = 0  # messages finished
+        self.rejected = 0  # times the next batch didn't start with an FSC
+        self.corrected = 0  # codewords fixed by BCH correction
+        self.corrected_bits = 0  # bits fixed by BCH correction
+        self.uncorrectable = 0  # codewords that couldn't be fixed
+
+    def feed(self, bits):
+        """
+            Push bits through the decoder
+
+            args:
+                bits - (bytearray) of 0/1 bits, already flipped
+            returns:
+                (PocsagMessage[]) messages that finished in these bits, not decoded yet
+        """
+        messages = []
+        idx = 0
+        end = len(bits)
+        self.bits += end
+
+        while idx < end:
+            if not self.in_batch:
+                found = self.detector.find(bits, idx, end)
+                if found is None:
+                    break
+
+                # the detector has fed everything up to the end of the FSC
+                idx = found + 32
+                self.in_batch = True
+                self.word_idx = 1
+                self.batches += 1
+                continue
+
+            if self.word_bits == 0 and idx + 32 <= end:
+                # whole word in this chunk, parse it in one go
+                word = int(bytes(bits[idx: idx + 32]).translate(BIT_CHARS), 2)
+                idx += 32
+            else:
+                word = self.word
+                word_bits = self.word_bits
+                while idx < end and word_bits < 32:
+                    word = (word << 1) | bits[idx]
+                    word_bits += 1
+                    idx += 1
+
+                if word_bits < 32:
+                    # wait for the rest of the word in the next chunk
+                    self.word = word
+                    self.word_bits = word_bits
+                    break
+
+                self.word = 0
+                self.word_bits = 0
+
+            self.word_end = idx
+            self._handle_word(word, messages)
+
+        return messages
+
+    def flush(self):
+        """
+            End the current message, ie at the end of a file
+
+            returns:
+                (PocsagMessage[]) the message that was in progress, if any
+        """
+        messages = []
+        self._end_message(messages)
+        return messages
+
+    def _handle_word(self, word, messages):
+        """
+            Deal with one full word while in a batch
+
+            args:
+                word - (int) the 32 bit word
+                messages - (PocsagMessage[]) finished messages get added here
+        """
+        if self.word_idx == 0:
+            if self._is_fsc(word):
+                self.word_idx = 1
+                self.batches += 1
+                return
+
+            # no FSC, so the batches are over. hand the word's bits back
+            # to a fresh detector like the batch reader would
+            self.rejected += 1
+            self._end_message(messages)
+            self.in_batch = False
+            self.detector.reset()
+            messages.extend(self._refeed_word(word))
+            return
+
+        frame_pos = (self.word_idx - 1) >> 1
+        self.word_idx = (self.word_idx + 1) % BATCH_WORDS
+
+        # no subscribed address can be in this frame, so unless the
+        # word carries on a message it isn't even BCH corrected
+        if self.message is None and self.subscriptions is not None and \
+                not self.subscriptions.wants_frame(frame_pos):
+            return
+
+        word, errors = self._correct(word)
+        if errors:
+            if errors == UNCORRECTABLE:
+                self.uncorrectable += 1
+            else:
+                self.corrected += 1
+                self.corrected_bits += errors
+        codeword = make_codeword(word, frame_pos, errors)
+
+        # addresses are the start of messages
+        if isinstance(codeword, PocsagAddressWord):
+            self._end_message(messages)
+            # messages to other capcodes are skipped
+            if self.subscriptions is None or self.subscriptions.wants(codeword):
+                self.message = PocsagMessage(codeword)
+
+        # end of message
+        elif isinstance(codeword, PocsagIdleFrame):
+            self._end_message(messages)
+
+        # add to the message
+        elif self.message is not None:
+            self.message.add_payload(codeword)
+
+    def _is_fsc(self, word):
+        """
+            args:
+                word - (int) the word where the next batch's FSC should be
+            returns:
+                (bool) True if it's close enough to the FSC to carry on
+        """
+        return fsc_errors(word) <= self.max_errors
+
+    def _correct(self, word):
+        """
+            args:
+                word - (int) a codeword as received
+            returns:
+                (int, int) of the corrected word and the number of bits
+                fixed, see pocsag_bch.correct
+        """
+        return correct(word)
+
+    def _refeed_word(self, word):
+        """
+            Feed the bits of a word again, after it turned out not to be an FSC
+
+            args:
+                word - (int) the 32 bit word
+            returns:
+                (PocsagMessage[]) messages that finished in its bits
+        """
+        messages = PocsagDecoder.feed(self, bytearray(
+            (word >> shift) & 1 for shift in range(31, -1, -1)))
+        self.bits -= 32
+        return messages
+
+    def _end_message(self, messages):
+        """
+            Finish the message in progress, if there is one
+
+            args:
+                messages - (PocsagMessage[]) it gets added here
+        """
+        if self.message is not None:
+            messages.append(self.message)
+            self.messages += 1
+            self.message = None
@@ -0,0 +1,117 @@
+"""
+    Module to drop pages that were already decoded
+
+    Paging networks often send the same page more than once, and
+    overlapping transmitters or several of our own channels pick it up
+    again. DedupCache remembers each page it has seen for window seconds,
+    keyed on (capcode, function, hash of the payload), and says if a new
+    one is a repeat.
+
+    The key only needs the raw payload ints, so a repeat is dropped
+    before it's decoded or written to a sink. Where only the decoded
+    record is left (ie pages from several channels) record_key hashes
+    the text instead.
+
+    The cache holds at most max_entries pages. It's an OrderedDict in
+    least recently seen order, so when it's full the page that was
+    seen longest ago is dropped first.
+"""
+import time
+from collections import OrderedDict
+
+DEDUP_WINDOW = 60.0  # seconds a page counts as a repeat for
+DEDUP_ENTRIES = 4096  # most pages remembered at once
+
+
+def message_key(message):
+    """
+        args:
+            message - (PocsagMessage) the message, doesn't need to be decoded
+        returns:
+            (tuple) the cache key
+    """
+    address = message.address
+    return address.capcode, address.function, hash(tuple(message.payload))
+
+
+def record_key(record):
+    """
+        args:
+            record - (dict) from pocsag_sinks.make_record
+        returns:
+            (tuple) the cache key
+    """
+    return record["capcode"], record["function"], hash(record["text"])
+
+
+class DedupCache(object):
+    """
+        args:
+            window - (float) seconds after a page is first seen that copies are dropped
+            max_entries - (int) most pages remembered at once
+    """
+
+    def __init__(self, window=DEDUP_WINDOW, max_entries=DEDUP_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> time first seen, least recently seen first
+        self.hits = 0  # repeats dropped
+        self.misses = 0  # new pages
+        self.evictions = 0  # pages forgotten to make room
+
+    def is_duplicate(self, key, now=None):
+        """
+            Check a page and remember it
+
+            args:
+                key - (tuple) from message_key or record_key
+                now - (float) unix time it was received, defaults to now
+            returns:
+                (bool) True if the same page was seen in the last window seconds
+        """
+        if now is None:
+            now = time.time()
+
+        first_seen = self.entries.pop(key, None)
+        if first_seen is not None and now - first_seen <= self.window:
+            self.hits += 1
+            # keep the time it was first seen, so a page that's sent over
+            # and over still comes through once every window
+            self.entries[key] = first_seen
+            return True
+
+        self.misses += 1
+        self.entries[key] = now
+        self._expire(now)
+        return False
+
+    def _expire(self, now):
+        """
+            Forget pages from the least recently seen end while they're
+            out of the window or the cache is too big
+
+            args:
+                now - (float) unix time
+        """
+        entries = self.entries
+        while entries:
+            # iter() on the dict itself, items() would copy every entry
+            key = next(iter(entries))
+            first_seen = entries[key]
+            if len(entries) > self.max_entries:
+                self.evictions += 1
+            elif now - first_seen <= self.window:
+                return
+            del entries[key]
+
+    def stats(self):
+        """
+            returns:
+                (dict) of the cache counters
+        """
+        return {
+            "dedup_hits": self.hits,
+            "dedup_misses": self.misses,
+            "dedup_evictions": self.evictions,
+            "dedup_entries": len(self.entries),
+        }
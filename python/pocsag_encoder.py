@@ -0,0 +1,349 @@
+"""
+    Program to make synthetic POCSAG bit streams, so the reader can be
+    tested and timed without an SDR and the GNU Radio flow graph
+
+    Pages are turned into transmissions the same way a paging
+    transmitter does it
+
+    | +++++++++++++++++++++++++++++++++++++++++++++++ |
+    |  576 bits       | 32 bits | 512 bits  | ...     |
+    |  preamble       |   FSC   | codewords | batches |
+    | +++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    - each address goes in the frame given by the low 3 bits of its
+      capcode, with idle codewords filling the frames in between
+    - the message codewords follow right after their address and can
+      run on into later frames and batches
+    - the last batch is filled up with idle codewords
+
+    Every codeword gets its BCH check bits and parity from pocsag_bch.
+    The bits can then have random bit errors added, be inverted like
+    the UDP sink sends them (high freq is logical 0 but GNU Radio sets
+    it to 1) and be left one bit per byte or packed 8 bits per byte
+    (by default the same way the reader reads them). With SOFT set in the
+    reader it writes float32 symbols like clock recovery puts out
+    instead, +1 for a logical 0 and -1 for a 1, with SOFT_NOISE of
+    gaussian noise added.
+
+    Running it writes a capture file that the reader can decode with
+    FROM_FILE = True
+"""
+import math
+import random
+from array import array
+
+from pocsag_batch import FRAME_SYNC_CODE
+from pocsag_bch import encode
+from pocsag_frame import IDLE_FRAME_CODE
+from pocsag_message import ALPHANUM_TABLE, BCD_TABLE, MESSAGE_TYPES
+from pocsag_reader import PACKED, BIT_ORDER, SOFT
+from pocsag_sync import PREAMBLE_LEN
+from udp_interface import INVERT_TABLE
+
+FILE_NAME = "./pocsag_test_bits"
+NUM_TRANSMISSIONS = 100
+PAGES_PER_TRANSMISSION = 4
+NOISE_BITS = 2000  # most random bits between transmissions
+BIT_ERROR_RATE = 0.0
+INVERTED = True  # flip the bits like the UDP sink does
+SOFT_NOISE = 0.0  # standard deviation of the noise on soft symbols
+SEED = 1
+
+FRAME_WORDS = 16  # codewords in a batch after the FSC
+
+# raw 4 bit value for each bcd symbol, the inverse of BCD_TABLE
+BCD_CODES = dict((symbol, raw) for raw, symbol in enumerate(BCD_TABLE) if symbol)
+BCD_FILL = BCD_CODES[" "]  # numeric messages are padded with spaces
+
+
+class Page(object):
+    """
+        One message to send
+
+        args:
+            capcode - (int) 21 bit address of the pager
+            text - (str) the message, only digits and "U -)(" for bcd
+            message_type - (str) one of MESSAGE_TYPES
+            function - (int) function bits (0-3), defaults to 0 for
+                bcd and 3 for alphanum
+    """
+    __slots__ = ("capcode", "text", "message_type", "function")
+
+    def __init__(self, capcode, text, message_type="alphanum", function=None):
+        if message_type not in MESSAGE_TYPES:
+            raise ValueError("unknown message type %r" % message_type)
+
+        self.capcode = capcode
+        self.text = text
+        self.message_type = message_type
+        if function is None:
+            function = 0 if message_type == "bcd" else 3
+        self.function = function
+
+
+def main():
+    """Main method"""
+    rnd = random.Random(SEED)
+    with open(FILE_NAME, mode='wb') as file:
+        for _ in range(NUM_TRANSMISSIONS):
+            bits = random_bits(rnd.randint(0, NOISE_BITS), rnd)
+            bits += encode_transmission(random_pages(PAGES_PER_TRANSMISSION, rnd))
+            if SOFT:
+                file.write(to_samples(bits, SOFT_NOISE, rnd))
+            else:
+                file.write(to_stream(bits, BIT_ERROR_RATE, INVERTED, PACKED, rnd, BIT_ORDER))
+        if SOFT:
+            file.write(to_samples(random_bits(NOISE_BITS, rnd), SOFT_NOISE, rnd))
+        else:
+            file.write(to_stream(random_bits(NOISE_BITS, rnd), 0, INVERTED, PACKED, rnd, BIT_ORDER))
+
+
+def alphanum_payload(text):
+    """
+        Pack alphanum text into 20 bit message payloads
+
+        Each char is 7 bit ascii sent LSB first, chars run on from one
+        payload into the next and the last one is padded with 0s
+
+        args:
+            text - (str) ascii text
+        returns:
+            (int[]) of the 20 bit payloads
+    """
+    payload = []
+    bits = 0
+    num_bits = 0
+    for char in bytearray(text):
+        # ALPHANUM_TABLE reverses the 7 bits, which goes both ways
+        bits = (bits << 7) | ALPHANUM_TABLE[char & 0x7F]
+        num_bits += 7
+        if num_bits >= 20:
+            num_bits -= 20
+            payload.append(bits >> num_bits)
+            bits &= (1 << num_bits) - 1
+
+    if num_bits:
+        payload.append(bits << (20 - num_bits))
+    return payload
+
+
+def numeric_payload(text):
+    """
+        Pack a numeric message into 20 bit message payloads
+
+        Each symbol is 4 bits sent LSB first, 5 to a payload,
+        and the last one is padded with spaces
+
+        args:
+            text - (str) digits and "U -)("
+        returns:
+            (int[]) of the 20 bit payloads
+    """
+    codes = [BCD_CODES[symbol] for symbol in text]
+    codes += [BCD_FILL] * (-len(codes) % 5)
+
+    payload = []
+    for idx in range(0, len(codes), 5):
+        msg = 0
+        for code in codes[idx: idx + 5]:
+            msg = (msg << 4) | code
+        payload.append(msg)
+    return payload
+
+
+def page_words(page):
+    """
+        Make the address and message codewords for a page
+
+        args:
+            page - (Page) what to send
+        returns:
+            (int[]) of 32 bit codewords, the address first
+    """
+    # address words have a 0 flag bit, message words a 1
+    words = [encode(((page.capcode >> 3) << 2) | page.function)]
+
+    if page.message_type == "bcd":
+        payload = numeric_payload(page.text)
+    else:
+        payload = alphanum_payload(page.text)
+
+    words.extend(encode((1 << 20) | msg) for msg in payload)
+    return words
+
+
+def encode_batches(pages):
+    """
+        Lay pages out in batches
+
+        args:
+            pages - (Page[]) what to send, in order
+        returns:
+            (int[][17]) of the words of each batch, FSC first
+    """
+    words = []
+    for page in pages:
+        # wait for the page's frame, in the next batch if it's passed
+        frame_pos = page.capcode & 0x7
+        while (len(words) % FRAME_WORDS) >> 1 != frame_pos:
+            words.append(IDLE_FRAME_CODE)
+        words.extend(page_words(page))
+
+    # always end on an idle so the last message is closed
+    words.append(IDLE_FRAME_CODE)
+    words.extend([IDLE_FRAME_CODE] * (-len(words) % FRAME_WORDS))
+
+    return [[FRAME_SYNC_CODE] + words[idx: idx + FRAME_WORDS]
+            for idx in range(0, len(words), FRAME_WORDS)]
+
+
+def encode_transmission(pages):
+    """
+        Make the bits for a whole transmission
+
+        args:
+            pages - (Page[]) what to send, in order
+        returns:
+            (bytearray) of logical 0/1 bits, preamble then batches
+    """
+    bits = bytearray([1, 0]) * (PREAMBLE_LEN // 2)
+    for batch in encode_batches(pages):
+        for word in batch:
+            bits.extend((word >> shift) & 1 for shift in range(31, -1, -1))
+    return bits
+
+
+def random_pages(count, rnd=random):
+    """
+        Make random pages, both alphanum and bcd
+
+        args:
+            count - (int) number of pages
+            rnd - (random.Random) source of randomness
+        returns:
+            (Page[])
+    """
+    pages = []
+    for _ in range(count):
+        capcode = rnd.getrandbits(21)
+        if rnd.random() < 0.5:
+            text = "".join(rnd.choice("0123456789U -)(") for _ in range(rnd.randint(1, 40)))
+            pages.append(Page(capcode, text, "bcd"))
+        else:
+            text = "".join(chr(rnd.randint(32, 126)) for _ in range(rnd.randint(1, 80)))
+            pages.append(Page(capcode, text, "alphanum"))
+    return pages
+
+
+def random_bits(count, rnd=random):
+    """
+        Make random bits, ie noise between transmissions
+
+        args:
+            count - (int) number of bits
+            rnd - (random.Random) source of randomness
+        returns:
+            (bytearray) of 0/1 bits
+    """
+    return bytearray(rnd.getrandbits(1) for _ in range(count))
+
+
+def add_bit_errors(bits, rate, rnd=random):
+    """
+        Flip random bits in place, each with probability rate
+
+        The gaps between errors are drawn from a geometric distribution,
+        so the cost is per error rather than per bit
+
+        args:
+            bits - (bytearray) of 0/1 bits
+            rate - (float) bit error rate (0-1)
+            rnd - (random.Random) source of randomness
+        returns:
+            (int) number of bits flipped
+    """
+    if rate <= 0:
+        return 0
+    if rate >= 1:
+        bits[:] = bits.translate(INVERT_TABLE)
+        return len(bits)
+
+    flipped = 0
+    log_keep = math.log(1.0 - rate)
+    idx = int(math.log(1.0 - rnd.random()) / log_keep)
+    while idx < len(bits):
+        bits[idx] ^= 1
+        flipped += 1
+        idx += 1 + int(math.log(1.0 - rnd.random()) / log_keep)
+    return flipped
+
+
+def pack_bits(bits, bit_order="msb"):
+    """
+        Pack 0/1 bits 8 to a byte like GNU Radio's unpacked to packed
+        block. Trailing bits are padded with 0s
+
+        args:
+            bits - (bytearray) of 0/1 bits
+            bit_order - (str) "msb" to put the first bit in the most
+                significant bit (GR_MSB_FIRST), "lsb" for the least
+        returns:
+            (bytearray) of packed bytes
+    """
+    bits = bits + bytearray(-len(bits) % 8)
+    packed = bytearray(len(bits) // 8)
+    for idx in range(len(packed)):
+        byte = 0
+        byte_bits = bits[8 * idx: 8 * idx + 8]
+        if bit_order == "lsb":
+            byte_bits.reverse()
+        for bit in byte_bits:
+            byte = (byte << 1) | bit
+        packed[idx] = byte
+    return packed
+
+
+def to_stream(bits, bit_error_rate=0.0, inverted=True, packed=False, rnd=random, bit_order="msb"):
+    """
+        Turn logical bits into what the UDP sink would send
+
+        args:
+            bits - (bytearray) of logical 0/1 bits
+            bit_error_rate - (float) chance of each bit being flipped
+            inverted - (bool) flip every bit like the flow graph does
+            packed - (bool) 8 bits per byte instead of 1
+            rnd - (random.Random) source of randomness for the bit errors
+            bit_order - (str) "msb" or "lsb", where the first bit goes in each packed byte
+        returns:
+            (str) of bytes, ready to write to a file or send over UDP
+    """
+    bits = bytearray(bits)
+    add_bit_errors(bits, bit_error_rate, rnd)
+    if inverted:
+        bits = bits.translate(INVERT_TABLE)
+    if packed:
+        bits = pack_bits(bits, bit_order)
+    return bytes(bits)
+
+
+def to_samples(bits, noise=0.0, rnd=random):
+    """
+        Turn logical bits into the float symbols clock recovery would put out
+
+        args:
+            bits - (bytearray) of logical 0/1 bits
+            noise - (float) standard deviation of the gaussian noise added
+            rnd - (random.Random) source of randomness for the noise
+        returns:
+            (str) of float32 bytes, ready to write to a file or send over UDP
+    """
+    levels = (1.0, -1.0)  # high freq is logical 0
+    if noise:
+        samples = array('f', (levels[bit] + rnd.gauss(0, noise) for bit in bits))
+    else:
+        samples = array('f', (levels[bit] for bit in bits))
+    return samples.tostring()
+
+
+if __name__ == "__main__":
+    main()
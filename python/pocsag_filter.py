@@ -0,0 +1,80 @@
+"""
+    Module to only decode the capcodes we care about
+
+    A pager only looks for its address in one frame of each batch, the
+    frame given by the low 3 bits of its capcode (frame_pos). Once it
+    sees its address it reads the message words after it, which can run
+    on into any frame, until an idle word or another address.
+
+    CapcodeFilter does the same: subscribed capcodes are indexed by
+    frame_pos, so frames where no subscribed pager can be addressed are
+    skipped without BCH correcting their words, and messages to other
+    addresses are never built or decoded.
+"""
+NUM_FRAMES = 8
+
+
+class CapcodeFilter(object):
+    """
+        Set of subscribed capcodes, indexed by frame_pos
+
+        args:
+            capcodes - (int[]) the capcodes to decode
+    """
+    __slots__ = ("addrs", "frames")
+
+    def __init__(self, capcodes=()):
+        self.addrs = [set() for _ in range(NUM_FRAMES)]  # addr bits by frame_pos
+        self.frames = [False] * NUM_FRAMES  # True where some capcode can be addressed
+        self.subscribe(capcodes)
+
+    def subscribe(self, capcodes):
+        """
+            Add capcodes to the filter
+
+            args:
+                capcodes - (int[]) the capcodes to add
+        """
+        for capcode in capcodes:
+            self.addrs[capcode & 0x7].add(capcode >> 3)
+            self.frames[capcode & 0x7] = True
+
+    def unsubscribe(self, capcodes):
+        """
+            Remove capcodes from the filter
+
+            args:
+                capcodes - (int[]) the capcodes to remove
+        """
+        for capcode in capcodes:
+            addrs = self.addrs[capcode & 0x7]
+            addrs.discard(capcode >> 3)
+            self.frames[capcode & 0x7] = len(addrs) != 0
+
+    def wants_frame(self, frame_pos):
+        """
+            Check if a subscribed capcode can be addressed in a frame
+
+            args:
+                frame_pos - (int) position of the frame in its batch (0-7)
+            returns:
+                (bool) False if the frame can be skipped
+        """
+        return self.frames[frame_pos]
+
+    def wants(self, address):
+        """
+            Check if an address codeword is to a subscribed capcode
+
+            args:
+                address - (PocsagAddressWord) the address
+            returns:
+                (bool) True if its message should be decoded
+        """
+        return address.addr in self.addrs[address.frame_pos]
+
+    def __contains__(self, capcode):
+        return (capcode >> 3) in self.addrs[capcode & 0x7]
+
+    def __len__(self):
+        return sum(len(addrs) for addrs in self.addrs)
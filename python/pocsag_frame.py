@@ -3,88 +3,152 @@
 
     Includes a class for the actual frame
     as well as classes for the 2 codewords in each frame
+
+    Codewords are 32 bit unsigned ints, where bit 1 of the
+    POCSAG spec is the MSB (1 << 31) and bit 32 is the LSB
 """
-IDLE_FRAME_CODE = "01111010100010011100000110010111"
+from pocsag_bch import correct, syndrome, popcount
+
+IDLE_FRAME_CODE = 0x7A89C197  # 01111010100010011100000110010111
+
+ADDR_MASK = 0x3FFFF  # 18 addr bits
+FUNCTION_MASK = 0x3  # 2 function bits
+MSG_MASK = 0xFFFFF  # 20 msg bits
+BCH_MASK = 0x3FF  # 10 bch check bits
 
 
 class PocsagFrame(object):
-    def __init__(self, frame_bits, frame_pos):
-        self.frame = frame_bits
+    __slots__ = ("frame", "frame_pos", "is_valid", "_errors", "_codewords")
+
+    def __init__(self, frame_words, frame_pos):
+        """
+            frame_words - (tuple) of 2 int codewords
+            frame_pos - (int) position of frame in batch (0-7)
+        """
+        self.frame = frame_words
         self.frame_pos = frame_pos
-        self.codewords = []
-        self.is_valid = self._is_valid(frame_bits, frame_pos)
+        self.is_valid = self._is_valid(frame_words, frame_pos)
+        self._errors = None
+        self._codewords = None
 
-    def _is_valid(self, frame_bits, frame_pos):
+    def _is_valid(self, frame_words, frame_pos):
         """
             Determine if the frame is valid
 
             args:
-                frame_bits - (str) bits representing the frame
+                frame_words - (tuple) of the 2 codewords in the frame
                 frame_pos - (int) position of frame in batch (0-7)
             returns:
                 (bool) of validity
         """
-        if len(frame_bits) != 64:
+        if len(frame_words) != 2:
             return False
         elif frame_pos < 0 or frame_pos > 7:
             return False
         else:
             return True
 
-    def get_codewords(self):
+    def get_codewords(self, errors=None):
         """
             Method to get 2 codewords from the frame
 
-            sets self.codewords to array of len 2 with codewords
+            The codewords aren't made until self.codewords is read,
+            so frames nobody looks at never allocate them
+
+            args:
+                errors - (int[]) if the frame's words were already BCH corrected
+                    (ie in bulk by pocsag_numpy), the number of bits fixed in each
         """
-        first_word_bits = self.frame[0:32]
-        second_word_bits = self.frame[32:64]
-
-        # decide first codeword
-        if first_word_bits == IDLE_FRAME_CODE:
-            self.codewords.append(PocsagIdleFrame())
-        elif first_word_bits[0] == '0':
-            self.codewords.append(PocsagAddressWord(
-                first_word_bits, self.frame_pos))
-        else:
-            self.codewords.append(PocsagMessageWord(first_word_bits))
-
-        # decide second frame
-        if second_word_bits == IDLE_FRAME_CODE:
-            self.codewords.append(PocsagIdleFrame())
-        elif second_word_bits[0] == '0':
-            self.codewords.append(PocsagAddressWord(
-                second_word_bits, self.frame_pos))
-        else:
-            self.codewords.append(PocsagMessageWord(second_word_bits))
+        self._errors = errors
+        self._codewords = None
+
+    @property
+    def codewords(self):
+        """(list) of the 2 codewords, made the first time they're needed"""
+        if self._codewords is None:
+            if self._errors is None:
+                self._codewords = [make_codeword(word, self.frame_pos)
+                                   for word in self.frame]
+            else:
+                self._codewords = [make_codeword(word, self.frame_pos, errors)
+                                   for word, errors in zip(self.frame, self._errors)]
+        return self._codewords
+
+
+def make_codeword(word, frame_pos, errors=None):
+    """
+        Function to turn a word into the right kind of codeword
+
+        args:
+            word - (int) the word as received
+            frame_pos - (int) position of its frame in the batch (0-7)
+            errors - (int) if the word was already BCH corrected,
+                the number of bits fixed
+        returns:
+            (PocsagIdleFrame, PocsagAddressWord or PocsagMessageWord)
+    """
+    # fix any bit errors before deciding what kind of word it is
+    if errors is None:
+        word, errors = correct(word)
+
+    if word == IDLE_FRAME_CODE:
+        return IDLE_FRAME
+    elif word >> 31 == 0:
+        return PocsagAddressWord(word, frame_pos, errors)
+    else:
+        return PocsagMessageWord(word, errors)
 
 
 class PocsagCodeWord(object):
     """
         Abstract class for codewords
+
+        Only the word and its error count are stored, every field
+        is worked out from the word when it's read
+
+        args:
+            word - (int) the codeword, after any BCH correction
+            errors - (int) number of bits BCH correction fixed to get word,
+                or UNCORRECTABLE if it couldn't be fixed
     """
+    __slots__ = ("word", "errors")
 
-    def __init__(self, word):
+    def __init__(self, word, errors=0):
         self.word = word
-        self.bch_check = word[21:31]
-        self.parity = word[31]
-        self.valid = self._is_valid()
+        self.errors = errors
+
+    @property
+    def corrected(self):
+        return self.errors > 0
+
+    @property
+    def bch_check(self):
+        return (self.word >> 1) & BCH_MASK
+
+    @property
+    def parity(self):
+        return self.word & 1
+
+    @property
+    def valid(self):
+        return self._is_valid()
 
     def _is_valid(self):
         """
             Method to perform a BCH check on the codeword
 
-            Uses parity bit to check validity
-            Even parity bit means that the total # of 1s should be even
+            The BCH syndrome of the first 31 bits has to be 0
+            and the parity bit makes the total # of 1s even
 
             returns:
-                (bool) - result of even parity check
+                (bool) - result of BCH and even parity check
         """
-        is_valid = self.word.count("1") % 2 == 0
-        if is_valid:
+        syn = syndrome(self.word)
+        ones = popcount(self.word)
+        if syn == 0 and ones % 2 == 0:
             return True
         else:
-            print "invalid", self.word, self.word.count("1"), self.parity
+            print "invalid", '{0:032b}'.format(self.word), syn, ones, self.parity
             return False
 
     def get_data(self):
@@ -105,38 +169,49 @@ class PocsagAddressWord(PocsagCodeWord):
 
         For example: addr = 111111111000000000, frame = 7
         address = 111111111000000000 + 111 => 111111111000000000111
+
+        self.capcode is that full 21 bit address as an int
     """
+    __slots__ = ("frame_pos",)
 
-    def __init__(self, word, frame_pos):
-        super(PocsagAddressWord, self).__init__(word)
-        self.addr = ""
-        self.function = ""
+    def __init__(self, word, frame_pos, errors=0):
+        super(PocsagAddressWord, self).__init__(word, errors)
         self.frame_pos = frame_pos
-        self._get_data()
 
-    def _get_data(self):
-        self.addr = self.word[1:19]
-        self.function = self.word[19:21]
+    @property
+    def addr(self):
+        return (self.word >> 13) & ADDR_MASK
+
+    @property
+    def function(self):
+        return (self.word >> 11) & FUNCTION_MASK
+
+    @property
+    def capcode(self):
+        return (((self.word >> 13) & ADDR_MASK) << 3) | self.frame_pos
 
 
 class PocsagMessageWord(PocsagCodeWord):
     """
         Message codewords have the following bit layout
         | ++++++++++++++++++++++++++++++++++++|
-        | 1  | 2 - 21    | 22 - 31   | 32     | 
+        | 1  | 2 - 21    | 22 - 31   | 32     |
         | id | msg bits  | bch check | parity |
         | ++++++++++++++++++++++++++++++++++++|
     """
+    __slots__ = ()
 
-    def __init__(self, word):
-        super(PocsagMessageWord, self).__init__(word)
-        self.msg = ""
-        self._get_data()
-
-    def _get_data(self):
-        self.msg = self.word[1:21]
+    @property
+    def msg(self):
+        return (self.word >> 11) & MSG_MASK
 
 
 class PocsagIdleFrame(object):
+    __slots__ = ("word",)
+
     def __init__(self):
         self.word = IDLE_FRAME_CODE
+
+
+# idle words are all the same, so every one is this object
+IDLE_FRAME = PocsagIdleFrame()
@@ -3,28 +3,79 @@
     A pocsag message is a combination of all message codewords between an address and another address or idle frame.
     Also includes the address codeword.
 """
-import binascii
+from pocsag_bch import UNCORRECTABLE
 from pocsag_frame import PocsagAddressWord, PocsagMessageWord, PocsagIdleFrame
 
 MESSAGE_TYPES = ["bcd", "alphanum"]
 BCD_SPECIAL_CHARS = ["", "U", " ", "-", ")", "("]
 
 
+def _reverse_bits(value, width):
+    """
+        Reverse the order of the low width bits of value
+
+        args:
+            value - (int) the bits
+            width - (int) how many bits to reverse
+        returns:
+            (int) the reversed bits
+    """
+    out = 0
+    for _ in range(width):
+        out = (out << 1) | (value & 1)
+        value >>= 1
+    return out
+
+
+# alphanum chars are 7 bit ascii sent LSB first, so index with
+# the 7 bits as received to get the ascii value
+ALPHANUM_TABLE = bytearray(_reverse_bits(i, 7) for i in range(128))
+
+# bcd symbols are 4 bits sent LSB first, so index with
+# the 4 bits as received to get the symbol
+BCD_TABLE = [str(val) if val < 10 else BCD_SPECIAL_CHARS[val - 10]
+             for val in [_reverse_bits(i, 4) for i in range(16)]]
+
+# message type the pager is told to expect by each value of the
+# address function bits. 0 is numeric, 3 is alphanumeric and 1/2 are
+# tone/alert, which networks mostly use for alphanumeric text too
+FUNCTION_TYPES = ["bcd", "alphanum", "alphanum", "alphanum"]
+
+# anything outside printable ascii, tab, cr, lf and the STX, ETX, EOT
+# and ETB that networks frame or end pages with can't be in real
+# alphanum text, used to score how well a decode went
+ALPHANUM_INVALID = "".join(chr(i) for i in range(128)
+                           if not (32 <= i < 127 or chr(i) in "\t\r\n\x02\x03\x04\x17"))
+
+# the function bits are only overridden when the decode they pick has at
+# least OVERRIDE_MIN_INVALID bad chars, and the other type's share of bad
+# chars is OVERRIDE_RATIO times smaller. a short page has too few chars
+# to tell, and bcd only has 1 bad symbol in 16 so it often looks clean
+OVERRIDE_MIN_INVALID = 2
+OVERRIDE_RATIO = 2
+
+
 class PocsagMessage(object):
+    __slots__ = ("address", "payload", "errors", "uncorrectable", "_message_type", "_message_out")
+
     def __init__(self, address):
         """
             address - PocsagAddressWord that it is sent to
-            message - concatenation of bits that are the message between addr and idle or new addr
-            message_codewords - the PocsagMessageWords that make the message (not used now but could be helpful)
+            payload - the 20 msg bits (int) of each message codeword between addr and idle or new addr
+            errors - number of bits BCH correction fixed in the message codewords
+            uncorrectable - number of message codewords that couldn't be fixed
             message_type - enum of MESSAGE_TYPES depending on what we think it is
-            message_out - ascii or bcd encoded message 
+            message_out - ascii or bcd encoded message
+
+            message_type and message_out are only worked out the first time
+            one of them is read, so messages nobody reads are never decoded
         """
         self.address = address
-        self.message = ""
-        self.message_codewords = []
-        self.message_type = ""
-        self.message_out = ""
-        self.bcd_out = ""
+        self.payload = []
+        self.errors = 0
+        self.uncorrectable = 0
+        self._message_type = None
+        self._message_out = None
 
     def add_payload(self, message):
         """
@@ -32,55 +83,109 @@ class PocsagMessage(object):
             args:
                 message - (PocsagMessageWord) the message codeword
         """
-        self.message_codewords.append(message)
-        self.message += message.msg
+        self.payload.append(message.msg)
+        if message.errors == UNCORRECTABLE:
+            self.uncorrectable += 1
+        else:
+            self.errors += message.errors
+        self._message_type = None
+
+    @property
+    def message_type(self):
+        if self._message_type is None:
+            self._determine_message_type()
+        return self._message_type
+
+    @property
+    def message_out(self):
+        if self._message_type is None:
+            self._determine_message_type()
+        return self._message_out
 
     def read_message(self):
-        raise NotImplementedError("not done yet")
+        """Method to read the message as whatever type it looks like"""
+        print self.message_out
 
     def read_alphanum(self):
         """ TEMP method to read alphanum for debug"""
-        self._decode_alphanum_message()
-        print self.message_out
+        print self._decode_alphanum_message()[0]
 
     def read_bcd(self):
         """TEMP method to read bcd for debug"""
-        self._decode_bcd_message()
-        print self.bcd_out
+        print self._decode_bcd_message()[0]
 
     def _determine_message_type(self):
-        raise NotImplementedError
+        """
+            Method to work out if the message is alphanum or bcd and decode it
+
+            The function bits say which type to try first. Each decoder counts
+            the chars that can't be in that type as it goes, so a mostly clean
+            decode is taken straight away and the message is only decoded once.
+            If it has OVERRIDE_MIN_INVALID or more bad chars the other type is
+            tried too, and only wins if it's clearly better, ie its share of
+            bad chars is OVERRIDE_RATIO times smaller.
+
+            Sets message_type and message_out
+        """
+        decoders = {
+            "bcd": self._decode_bcd_message,
+            "alphanum": self._decode_alphanum_message,
+        }
+        first = FUNCTION_TYPES[self.address.function]
+        text, invalid = decoders[first]()
+        message_type = first
+
+        if invalid >= OVERRIDE_MIN_INVALID:
+            second = MESSAGE_TYPES[first == "bcd"]
+            other_text, other_invalid = decoders[second]()
+
+            # compare the shares of bad chars, cross multiplied to keep it in ints
+            if OVERRIDE_RATIO * other_invalid * max(len(text), 1) < invalid * max(len(other_text), 1):
+                text = other_text
+                message_type = second
+
+        self._message_type = message_type
+        self._message_out = text
 
     def _decode_alphanum_message(self):
         """
             Method to decode message as alphanumeric
-            Walks through self.message 7 bits at a time
-            Turns that into 2 bytes and ascii encodes it
-            Adds resulting char to 
+            Walks through the payload 7 bits at a time, carrying
+            leftover bits from one 20 bit msg into the next, and
+            looks each char up in ALPHANUM_TABLE
+
+            Bits left over at the end that don't make a full char are
+            padding, as are trailing null chars, so both are dropped.
+            Alphanum padding is 0s, so left over bits that aren't
+            (ie the space fill of a bcd message) count as a bad char
+
+            returns:
+                (str, int) the text and the number of chars that can't be in alphanum text
         """
-        char_cnt = 0
+        chars = bytearray()
+        bits = 0
+        num_bits = 0
+
+        for msg in self.payload:
+            bits = (bits << 20) | msg
+            num_bits += 20
 
-        # TODO: have to account for null strings that may be less than 7 bits
-        # TODO: look into if the ascii converter matches what we expect. seems off rn
-        while char_cnt * 7 < len(self.message):
-            char = self.message[char_cnt * 7: (char_cnt + 1) * 7]
+            while num_bits >= 7:
+                num_bits -= 7
+                chars.append(ALPHANUM_TABLE[(bits >> num_bits) & 0x7F])
 
-            # flip bits since they are lsb for alphanum messages
-            # also add a 0 at the beginning since they use 7 bit
-            # ascii, but binascii uses 2 byte (8 bit)
-            char = '0' + char[::-1]
-            hex_char = ('%x' % int(char, 2)).zfill(2)
+            bits &= (1 << num_bits) - 1
 
-            self.message_out += binascii.unhexlify(hex_char)
-            char_cnt += 1
+        text = str(chars).rstrip("\x00")
+        return text, len(text) - len(text.translate(None, ALPHANUM_INVALID)) + (bits != 0)
 
     def _decode_bcd_message(self):
         """
             Method to decode message as numeric bcd message
             4 bit BCD symbols, 5 to a message (20 bit messages)
 
-            Most significant char is the last one (bits 30-27)
-            So we need to add new chars to the front, not back
+            Each symbol is sent LSB first, so the bits are reversed
+            before using them (BCD_TABLE does that lookup)
 
             0x0 - 0x9 are just the digit in the hex value
             0xA = reserved (just make it "")
@@ -90,31 +195,19 @@ class PocsagMessage(object):
             0xE = ")"
             0xF = "("
 
-            NOTE: trailing a 0xC to each byte should make it translate
-            right to ascii (at least for numbers), might try this later
-            but it shouldn't matter much since we get the digit anyways
-        """
-        idx = 0
+            The last msg is padded with spaces (0xC), so trailing
+            spaces are dropped like the alphanum decoder drops nulls
 
-        while idx < len(self.message) - 20:
-            bcd_message = self.message[idx: idx + 20]
-            bcd_text = ""
-
-            # put the message into bytes
-            for i in range(5):
-                bcd_byte = bcd_message[i*4: (i + 1)*4]
-
-                if len(bcd_byte) == 4:
-                    bcd_val = int(bcd_byte, 2)
-                    if bcd_val < 10:
-                        bcd_text = str(bcd_val) + bcd_text
-                    else:
-                        # use BCD_SPECIAL_CHARS
-                        bcd_text = BCD_SPECIAL_CHARS[bcd_val - 10] + bcd_text
-
-                else:
-                    print "Error: byte less than 4 bits"
-
-            idx += 20
-
-            self.bcd_out += bcd_text
+            returns:
+                (str, int) the text and the number of reserved symbols,
+                which a real bcd message won't have
+        """
+        symbols = []
+        for msg in self.payload:
+            symbols.append(BCD_TABLE[msg >> 16])
+            symbols.append(BCD_TABLE[(msg >> 12) & 0xF])
+            symbols.append(BCD_TABLE[(msg >> 8) & 0xF])
+            symbols.append(BCD_TABLE[(msg >> 4) & 0xF])
+            symbols.append(BCD_TABLE[msg & 0xF])
+
+        return "".join(symbols).rstrip(" "), symbols.count("")
@@ -0,0 +1,250 @@
+"""
+    Module to expose the reader's counters to Prometheus
+
+    The decoder, sync detector and receive pipeline already keep plain
+    int counters as they go (bits, batches, messages, dropped chunks, ...).
+    Nothing extra happens on the hot paths: a Metrics registry holds
+    functions that read those counters, and they're only called when
+    the endpoint is scraped. Decode latency is the one thing measured
+    per message, into a Histogram with fixed buckets.
+
+    serve() starts a small HTTP server on its own thread that answers
+    GET /metrics in the Prometheus text exposition format
+"""
+import bisect
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# seconds, from a chunk arriving to its messages being decoded
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+
+class Histogram(object):
+    """
+        Counts of observed values in fixed buckets
+
+        args:
+            buckets - (float[]) upper bounds of the buckets, sorted
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+            Add a value
+
+            args:
+                value - (float) the value
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics(object):
+    """
+        Registry of metrics that renders them in the text exposition format
+    """
+
+    def __init__(self):
+        self.metrics = []  # (name, type, help, read function or Histogram)
+
+    def counter(self, name, help_text, read):
+        """
+            Add a counter, a value that only goes up
+
+            args:
+                name - (str) metric name, should end in _total
+                help_text - (str) description
+                read - (function) returns the current value
+        """
+        self.metrics.append((name, "counter", help_text, read))
+
+    def gauge(self, name, help_text, read):
+        """
+            Add a gauge, a value that goes up and down
+
+            args:
+                name - (str) metric name
+                help_text - (str) description
+                read - (function) returns the current value
+        """
+        self.metrics.append((name, "gauge", help_text, read))
+
+    def histogram(self, name, help_text, histogram):
+        """
+            Add a histogram
+
+            args:
+                name - (str) metric name
+                help_text - (str) description
+                histogram - (Histogram) the values
+        """
+        self.metrics.append((name, "histogram", help_text, histogram))
+
+    def render(self):
+        """
+            returns:
+                (str) every metric in the text exposition format
+        """
+        lines = []
+        for name, kind, help_text, source in self.metrics:
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, kind))
+            if kind != "histogram":
+                lines.append("%s %s" % (name, _format(source())))
+                continue
+
+            cumulative = 0
+            for bound, count in zip(source.buckets + ["+Inf"], source.counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _format(bound)
+                lines.append('%s_bucket{le="%s"} %d' % (name, le, cumulative))
+            lines.append("%s_sum %s" % (name, _format(source.sum)))
+            lines.append("%s_count %d" % (name, source.count))
+        return "\n".join(lines) + "\n"
+
+
+def _format(value):
+    """
+        args:
+            value - (int or float)
+        returns:
+            (str) the value how Prometheus expects it
+    """
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def add_decoder(metrics, decoder):
+    """
+        Add the counters of a PocsagDecoder and its SyncDetector
+
+        args:
+            metrics - (Metrics)
+            decoder - (PocsagDecoder)
+    """
+    detector = decoder.detector
+    metrics.counter("pocsag_bits_total", "Bits fed to the decoder",
+                    lambda: decoder.bits)
+    metrics.counter("pocsag_preambles_total", "Preambles found",
+                    lambda: detector.preambles)
+    metrics.counter("pocsag_syncs_total", "FSCs found by the sync search",
+                    lambda: detector.syncs)
+    metrics.counter("pocsag_batches_total", "Batches accepted",
+                    lambda: decoder.batches)
+    metrics.counter("pocsag_batches_rejected_total",
+                    "Words where the next batch's FSC should be that weren't an FSC",
+                    lambda: decoder.rejected)
+    metrics.counter("pocsag_codewords_corrected_total", "Codewords fixed by BCH and parity correction",
+                    lambda: decoder.corrected)
+    metrics.counter("pocsag_corrected_bits_total", "Bits fixed by BCH and parity correction",
+                    lambda: decoder.corrected_bits)
+    metrics.counter("pocsag_codewords_uncorrectable_total", "Codewords failing the BCH or parity check",
+                    lambda: decoder.uncorrectable)
+    metrics.counter("pocsag_messages_total", "Messages decoded",
+                    lambda: decoder.messages)
+
+
+def add_pipeline(metrics, pipeline):
+    """
+        Add the counters of a ReceivePipeline
+
+        args:
+            metrics - (Metrics)
+            pipeline - (ReceivePipeline)
+    """
+    metrics.counter("pocsag_received_bits_total", "Bits received from the socket",
+                    lambda: pipeline.received_bits)
+    metrics.counter("pocsag_dropped_chunks_total", "Chunks dropped because the queue was full",
+                    lambda: pipeline.dropped_chunks)
+    metrics.gauge("pocsag_queue_depth", "Chunks waiting for the decoder",
+                  lambda: pipeline.queue.qsize())
+    metrics.gauge("pocsag_queue_high_water", "Most chunks that were ever waiting",
+                  lambda: pipeline.high_water)
+    metrics.gauge("pocsag_queue_size", "Most chunks the queue can hold",
+                  lambda: pipeline.queue.maxsize)
+
+
+def add_soft(metrics, decoder):
+    """
+        Add the counters of a SoftDecoder
+
+        args:
+            metrics - (Metrics)
+            decoder - (SoftDecoder)
+    """
+    detector = decoder.detector
+    metrics.counter("pocsag_soft_syncs_total", "FSCs only accepted because the wrong bits were unreliable",
+                    lambda: detector.soft_syncs)
+    metrics.counter("pocsag_soft_syncs_rejected_total", "FSC candidates too far off to accept",
+                    lambda: detector.rejected_syncs)
+    metrics.counter("pocsag_chase_trials_total", "Bit flips tried by chase decoding",
+                    lambda: decoder.chase_trials)
+    metrics.counter("pocsag_codewords_chase_corrected_total", "Codewords fixed by chase decoding",
+                    lambda: decoder.chase_corrected)
+
+
+def add_dedup(metrics, dedup):
+    """
+        Add the counters of a DedupCache
+
+        args:
+            metrics - (Metrics)
+            dedup - (DedupCache)
+    """
+    metrics.counter("pocsag_dedup_hits_total", "Repeated pages dropped",
+                    lambda: dedup.hits)
+    metrics.counter("pocsag_dedup_misses_total", "Pages not seen in the dedup window",
+                    lambda: dedup.misses)
+    metrics.counter("pocsag_dedup_evictions_total", "Pages forgotten to keep the dedup cache bounded",
+                    lambda: dedup.evictions)
+    metrics.gauge("pocsag_dedup_entries", "Pages in the dedup cache",
+                  lambda: len(dedup.entries))
+
+
+def serve(metrics, addr, port):
+    """
+        Serve the metrics on their own thread
+
+        args:
+            metrics - (Metrics) what to serve
+            addr - (str) address to listen on
+            port - (int) port to listen on
+        returns:
+            (HTTPServer) call shutdown() on it to stop
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # don't print every scrape
+            pass
+
+    server = HTTPServer((addr, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
@@ -0,0 +1,205 @@
+"""
+    Program to decode many POCSAG channels in one process
+
+    pocsag_service runs a process, a receiver thread and a queue per
+    channel. That's worth it for busy channels, but dozens of low rate
+    channels mostly sit idle and a process each is a lot of overhead.
+
+    Here one select() loop waits on every channel's socket at once, and
+    whichever are ready are drained and fed to that channel's own
+    PocsagDecoder. Decoding is incremental, so no channel waits on
+    another channel's batches to finish arriving.
+
+    | ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+    | sockets -> select loop -> decoder per channel -> queue -> sink thread |
+    | ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    Records go to the sink on its own thread, so a slow write (a SQLite
+    commit, a full console) doesn't stop the loop from draining the
+    sockets. If the sink falls so far behind that its queue is full,
+    records are dropped and counted instead of blocking reception.
+
+    Channels are listed in CHANNELS in pocsag_service. Repeated pages
+    are dropped before they're decoded with one DedupCache shared by
+    every channel, so the same page on two channels is only kept once.
+"""
+import select
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from pocsag_dedup import message_key
+from pocsag_filter import CapcodeFilter
+from pocsag_reader import PAYLOAD_SIZE, SINK, OUTPUT_FILE, SINK_MAX_RECORDS, SINK_MAX_SECONDS, \
+    PACKED, BIT_ORDER, SOFT, make_decoder, make_dedup
+from pocsag_service import CHANNELS, STATS_INTERVAL
+from pocsag_sinks import make_record, make_sink
+from udp_interface import UdpInterface
+
+SINK_QUEUE_SIZE = 4096  # records waiting for the sink thread
+
+
+class ChannelReceiver(object):
+    """
+        Socket and decoder of one channel
+
+        args:
+            channel - (Channel) what to decode
+            payload_size - (int) bytes per datagram
+    """
+
+    def __init__(self, channel, payload_size=PAYLOAD_SIZE):
+        self.channel = channel
+        self.conn = UdpInterface(channel.addr, channel.port, payload_size,
+                                 packed=PACKED, bit_order=BIT_ORDER, soft=SOFT)
+        subscriptions = None if channel.capcodes is None else CapcodeFilter(channel.capcodes)
+        self.decoder = make_decoder(subscriptions)
+        self.received_chunks = 0
+        self.received_bits = 0
+
+    def fileno(self):
+        """
+            lets select() wait on the receiver like a socket
+
+            returns:
+                (int) file descriptor of the socket
+        """
+        return self.conn.sock.fileno()
+
+    def receive(self):
+        """
+            read what's waiting on the socket and decode it,
+            only call once select() says the socket is ready
+
+            returns:
+                (PocsagMessage[]) messages finished by the new bits, not decoded yet
+        """
+        chunk = self.conn.receive()
+        self.received_chunks += 1
+        self.received_bits += len(chunk)
+        return self.decoder.feed(chunk)
+
+    def stats(self, elapsed):
+        """
+            args:
+                elapsed - (float) seconds since reception started
+            returns:
+                (dict) of the receive and decode counters
+        """
+        return {
+            "received_chunks": self.received_chunks,
+            "received_bits": self.received_bits,
+            "batches": self.decoder.batches,
+            "messages": self.decoder.messages,
+            # ratio of bits received to the symbol rate, ~1.0 when the
+            # flow graph is streaming in real time
+            "rate_ratio": round(self.received_bits / (elapsed * self.channel.symbol_rate), 3),
+        }
+
+
+class SinkThread(object):
+    """
+        Writes records to a sink on its own thread
+
+        args:
+            sink - (PrintSink, JsonlSink or SqliteSink) where the records go
+            queue_size - (int) max records waiting to be written
+    """
+
+    def __init__(self, sink, queue_size=SINK_QUEUE_SIZE):
+        self.sink = sink
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0  # records dropped because the queue was full
+        self.thread = threading.Thread(target=self._write_loop)
+        self.thread.daemon = True
+
+    def start(self):
+        """Start the writer thread"""
+        self.thread.start()
+
+    def write(self, record):
+        """
+            Queue a record without waiting for the sink
+
+            args:
+                record - (dict) from make_record
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+            Write the records still queued and close the sink
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def _write_loop(self):
+        """
+            Body of the writer thread, None in the queue stops it
+        """
+        try:
+            while True:
+                try:
+                    record = self.queue.get(timeout=SINK_MAX_SECONDS)
+                except queue.Empty:
+                    record = False
+
+                if record is None:
+                    return
+                if record:
+                    self.sink.write(record)
+                self.sink.tick()
+        finally:
+            self.sink.close()
+
+
+def main(channels=CHANNELS):
+    """
+        Decode every channel until ctrl-c
+
+        args:
+            channels - (Channel[]) the channels to decode
+    """
+    receivers = [ChannelReceiver(channel) for channel in channels]
+    dedup = make_dedup()
+
+    writer = SinkThread(make_sink(SINK, OUTPUT_FILE, SINK_MAX_RECORDS, SINK_MAX_SECONDS))
+    writer.start()
+
+    started = time.time()
+    last_stats = started
+    try:
+        while True:
+            ready, _, _ = select.select(receivers, [], [], 1.0)
+            now = time.time()
+
+            for receiver in ready:
+                label = receiver.channel.label
+                for message in receiver.receive():
+                    if dedup is not None and dedup.is_duplicate(message_key(message), now):
+                        continue
+                    writer.write(make_record(message, label, now))
+
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                for receiver in receivers:
+                    print "[%s] stats %s" % (receiver.channel.label, receiver.stats(now - started))
+                stats = {"sink_dropped": writer.dropped}
+                if dedup is not None:
+                    stats.update(dedup.stats())
+                print "stats %s" % stats
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
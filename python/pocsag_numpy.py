@@ -0,0 +1,317 @@
+"""
+    Module with a NumPy engine for decoding capture files
+
+    The pure python reader walks the capture one bit at a time, which is
+    fine in real time but slow for hours of archived captures. This does
+    the same steps on whole arrays instead:
+
+    - memory map the capture with np.memmap and flip every bit at once
+    - pack the 32 bit word starting at every bit position
+    - find the FSC (within max_errors) and the preamble before it
+      with vectorized comparisons over the whole array
+    - pull every batch out as a uint32 array and BCH correct all
+      the codewords in one go
+
+    The corrected words then go into PocsagBatch objects like
+    the python path, so messages come out the same.
+
+    Packed captures (8 bits per byte) are unpacked with np.unpackbits
+    as each chunk is loaded.
+
+    Files are memory mapped and decoded CHUNK_SIZE bits at a time, so
+    memory stays bounded for multi GB captures. Each chunk overlaps the
+    last one by enough to catch a preamble + batch on the boundary, and a
+    run of batches that reaches the end of a chunk is decoded in the next.
+
+    Needs numpy, pocsag_reader falls back to the python path without it
+"""
+import os
+
+import numpy as np
+
+from pocsag_batch import PocsagBatch, FRAME_SYNC_CODE, BATCH_WORDS
+from pocsag_bch import SYNDROME_TABLES, ERROR_PATTERNS, UNCORRECTABLE
+from pocsag_sync import PREAMBLE_LEN
+
+BATCH_SIZE = BATCH_WORDS * 32
+CHUNK_SIZE = 1 << 22  # bits per chunk, ~1 hour at 1200 Bd
+
+POPCOUNT_8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+SYNDROME_ARRAYS = [np.array(table, dtype=np.uint32) for table in SYNDROME_TABLES]
+
+# syndrome -> error pattern, 0 where the syndrome isn't a 1 or 2 bit error
+PATTERN_ARRAY = np.zeros(1 << 10, dtype=np.uint32)
+for _syn, _pattern in ERROR_PATTERNS.items():
+    PATTERN_ARRAY[_syn] = _pattern
+
+
+def load_chunk(data, start, stop, packed=False, bit_order="msb"):
+    """
+        Copy part of a memory mapped capture and flip the bits
+
+        args:
+            data - (np.memmap) the capture
+            start - (int) first bit
+            stop - (int) bit to stop at
+            packed - (bool) the capture is 8 bits per byte instead of 1
+            bit_order - (str) "msb" or "lsb", where the first bit is in each packed byte
+        returns:
+            (np.uint8[]) of the flipped 0/1 bits
+    """
+    if packed:
+        bits = np.unpackbits(np.asarray(data[start // 8: (stop + 7) // 8]))
+        if bit_order == "lsb":
+            bits = bits.reshape(-1, 8)[:, ::-1].ravel()
+        skip = start % 8
+        chunk = bits[skip: skip + stop - start]
+    else:
+        chunk = np.asarray(data[start:stop])
+
+    # flip bit since high freq is logical 0 and low freq is logical 1
+    return chunk ^ 1
+
+
+def popcount(words):
+    """
+        Count the 1s in every word
+
+        args:
+            words - (np.uint32[]) the words
+        returns:
+            (np.int32[]) number of set bits in each
+    """
+    return (POPCOUNT_8[words & 0xFF] + POPCOUNT_8[(words >> 8) & 0xFF] +
+            POPCOUNT_8[(words >> 16) & 0xFF] + POPCOUNT_8[words >> 24])
+
+
+def window_words(bits):
+    """
+        Pack the 32 bit word that starts at every bit position, MSB first
+
+        args:
+            bits - (np.uint8[]) of 0/1 bits
+        returns:
+            (np.uint32[]) of len(bits) - 31 words, words[i] is bits[i:i + 32]
+    """
+    count = len(bits) - 31
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    words = np.empty(count, dtype=np.uint32)
+
+    # np.packbits only packs from byte aligned positions, so pack once
+    # for each of the 8 starting bits and interleave the results
+    for shift in range(min(8, count)):
+        packed = np.packbits(bits[shift:]).astype(np.uint32)
+        num = len(range(shift, count, 8))
+        words[shift::8] = ((packed[0:num] << 24) | (packed[1:num + 1] << 16) |
+                           (packed[2:num + 2] << 8) | packed[3:num + 3])
+    return words
+
+
+def preamble_before(bits, positions, preamble_len=PREAMBLE_LEN):
+    """
+        Check which positions have a full preamble right before them
+
+        args:
+            bits - (np.uint8[]) of 0/1 bits
+            positions - (np.int[]) candidate batch starts
+            preamble_len - (int) number of alternating bits needed
+        returns:
+            (np.bool[]) True where bits[pos - preamble_len:pos] is "10" * n
+    """
+    # repeats[k] is the number of neighbouring pairs before bit k that match
+    repeats = np.zeros(len(bits), dtype=np.int64)
+    np.cumsum(bits[1:] == bits[:-1], out=repeats[1:])
+
+    ok = positions >= preamble_len
+    pos = positions[ok]
+    found = np.zeros(len(positions), dtype=bool)
+    # alternating means no repeats in the window, and the preamble ends on a 0
+    found[ok] = ((repeats[pos - 1] == repeats[pos - preamble_len]) &
+                 (bits[pos - 1] == 0))
+    return found
+
+
+def correct_words(words):
+    """
+        BCH correct an array of codewords, same rules as pocsag_bch.correct
+
+        args:
+            words - (np.uint32[]) codewords as received, any shape
+        returns:
+            (np.uint32[], np.int32[]) of the corrected words and the number
+            of bits fixed in each (UNCORRECTABLE if it couldn't be)
+    """
+    code = words >> 1
+    syn = (SYNDROME_ARRAYS[0][code & 0xFF] ^ SYNDROME_ARRAYS[1][(code >> 8) & 0xFF] ^
+           SYNDROME_ARRAYS[2][(code >> 16) & 0xFF] ^ SYNDROME_ARRAYS[3][code >> 24])
+
+    pattern = PATTERN_ARRAY[syn]
+    fixed = words ^ pattern
+    errors = popcount(pattern)
+
+    parity_bad = (popcount(fixed) & 1).astype(bool)
+    uncorrectable = ((syn != 0) & (pattern == 0)) | (parity_bad & (errors == 2))
+
+    # a bad parity bit on its own or alongside a 1 bit BCH error
+    fix_parity = parity_bad & ~uncorrectable
+    fixed ^= fix_parity.astype(np.uint32)
+    errors += fix_parity
+
+    fixed[uncorrectable] = words[uncorrectable]
+    errors[uncorrectable] = UNCORRECTABLE
+    return fixed, errors
+
+
+def make_batches(batch_words, max_errors=0):
+    """
+        Turn a 2d array of batch words into parsed PocsagBatch objects
+
+        args:
+            batch_words - (np.uint32[][17]) one row per batch, FSC first
+            max_errors - (int) number of bit errors allowed in each FSC
+        returns:
+            (PocsagBatch[])
+    """
+    fixed, errors = correct_words(batch_words[:, 1:])
+
+    batches = []
+    for row in range(len(batch_words)):
+        batch = PocsagBatch([int(batch_words[row, 0])] + fixed[row].tolist(),
+                            max_errors)
+        batch.parse_frames(errors[row].tolist())
+        batches.append(batch)
+    return batches
+
+
+def find_transmissions(bits, max_errors=0, require_preamble=True, min_start=0):
+    """
+        Find every run of batches in the bits
+
+        Follows the same rules as SyncDetector + group_batches: a batch run
+        starts at an FSC (after a preamble if require_preamble) and goes on
+        while every 544 bits starts with an FSC. The next run has to start
+        after the last one ends.
+
+        args:
+            bits - (np.uint8[]) of 0/1 bits
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            min_start - (int) where the last run before these bits ended,
+                relative to bits (so <= 0 if it was in an earlier chunk)
+        returns:
+            (list) of (offset, np.uint32[][17]) with the bit offset
+            of each run and its batch words
+    """
+    words = window_words(bits)
+    is_fsc = popcount(words ^ np.uint32(FRAME_SYNC_CODE)) <= max_errors
+
+    candidates = np.nonzero(is_fsc)[0]
+    if require_preamble:
+        candidates = candidates[preamble_before(bits, candidates)]
+
+    word_offsets = 32 * np.arange(BATCH_WORDS)
+    transmissions = []
+    end = min_start
+    for offset in candidates.tolist():
+        # the preamble can't overlap the last run either
+        if offset < end or (require_preamble and offset - PREAMBLE_LEN < end):
+            continue
+
+        num_batches = 0
+        while (offset + (num_batches + 1) * BATCH_SIZE <= len(bits) and
+               is_fsc[offset + num_batches * BATCH_SIZE]):
+            num_batches += 1
+
+        if num_batches == 0:
+            continue
+
+        starts = offset + BATCH_SIZE * np.arange(num_batches)
+        transmissions.append(
+            (offset, words[starts[:, None] + word_offsets[None, :]]))
+        end = offset + BATCH_SIZE * num_batches
+    return transmissions
+
+
+def decode_file(file_name, max_errors=0, require_preamble=True, chunk_size=CHUNK_SIZE,
+                packed=False, bit_order="msb"):
+    """
+        Decode a capture file a chunk at a time
+
+        args:
+            file_name - (str) path to the capture
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            chunk_size - (int) number of bits to decode at once
+            packed - (bool) the capture is 8 bits per byte instead of 1
+            bit_order - (str) "msb" or "lsb", where the first bit is in each packed byte
+        yields:
+            (int, batch[]) of the bit offset of each transmission
+            in the file and its batches, in capture order
+    """
+    for offset, batch_words in find_file_transmissions(
+            file_name, max_errors, require_preamble, chunk_size, packed, bit_order):
+        yield offset, make_batches(batch_words, max_errors)
+
+
+def find_file_transmissions(file_name, max_errors=0, require_preamble=True, chunk_size=CHUNK_SIZE,
+                            packed=False, bit_order="msb"):
+    """
+        Find every run of batches in a capture file a chunk at a time
+        without parsing them
+
+        args:
+            file_name - (str) path to the capture
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            chunk_size - (int) number of bits to search at once
+            packed - (bool) the capture is 8 bits per byte instead of 1
+            bit_order - (str) "msb" or "lsb", where the first bit is in each packed byte
+        yields:
+            (int, np.uint32[][17]) of the bit offset of each run
+            in the file and its batch words, in capture order
+    """
+    if os.path.getsize(file_name) == 0:
+        return
+
+    data = np.memmap(file_name, dtype=np.uint8, mode='r')
+    num_bits = len(data) * 8 if packed else len(data)
+    # bits before a sync that have to be in the same chunk as it
+    lead = PREAMBLE_LEN if require_preamble else 0
+
+    start = 0  # first bit of the chunk
+    last_end = 0  # where the last run of batches ended
+    size = chunk_size
+    while start < num_bits:
+        stop = min(start + size, num_bits)
+        final = stop == num_bits
+        bits = load_chunk(data, start, stop, packed, bit_order)
+
+        # if nothing runs past the end, the next chunk starts early enough
+        # to see a preamble + first batch that crosses the boundary
+        resume = stop if final else stop - (lead + BATCH_SIZE)
+        found = []
+        for offset, batch_words in find_transmissions(
+                bits, max_errors, require_preamble, last_end - start):
+            run_end = start + offset + BATCH_SIZE * len(batch_words)
+            if not final and run_end + BATCH_SIZE > stop:
+                # can't tell if the run goes on past the chunk, do it next time
+                resume = min(resume, start + offset - lead)
+                break
+            found.append((start + offset, run_end, batch_words))
+
+        if resume <= start:
+            # one run of batches is bigger than a whole chunk
+            size *= 2
+            continue
+
+        for offset, run_end, batch_words in found:
+            # the next chunk starts early enough to find these again
+            if offset - lead >= resume:
+                break
+            last_end = run_end
+            yield offset, batch_words
+
+        start = resume
+        size = chunk_size
@@ -0,0 +1,146 @@
+"""
+    Program to decode a long capture file on every core
+
+    Transmissions separated by preambles don't depend on each other,
+    so the file is decoded in 2 passes:
+
+    - a cheap first pass finds where each run of batches starts and how
+      many batches it has, without parsing anything (vectorized if numpy
+      is installed, otherwise pocsag_reader.find_stream_runs)
+    - each run is sent to a process pool, which reads those bits back
+      from the file and does the full group_batches / message decode
+
+    Results come back in capture order with the bit offset of each run.
+"""
+import multiprocessing
+
+from file_interface import FileInterface
+from pocsag_reader import group_batches, assemble_messages, find_stream_runs, BATCH_SIZE, FILE_NAME, \
+    FSC_MAX_ERRORS, REQUIRE_PREAMBLE, USE_NUMPY, SUBSCRIPTIONS, CHANNEL, SINK, OUTPUT_FILE, \
+    SINK_MAX_RECORDS, SINK_MAX_SECONDS, PACKED, BIT_ORDER, capture_time, make_dedup
+from pocsag_dedup import record_key
+from pocsag_sinks import make_record, make_sink
+from udp_interface import INVERT_TABLE, make_unpack_table, unpack_bits
+
+try:
+    import pocsag_numpy
+except ImportError:
+    pocsag_numpy = None
+
+PROCESSES = multiprocessing.cpu_count()
+RUNS_PER_TASK = 16  # runs of batches sent to a worker at a time
+
+
+def main():
+    """Main method"""
+    sink = make_sink(SINK, OUTPUT_FILE, SINK_MAX_RECORDS, SINK_MAX_SECONDS)
+    # runs are decoded on different processes, so repeats are only
+    # found once the records are back in capture order. pages are timed
+    # by the offset of their run in the capture, not by the clock
+    dedup = make_dedup()
+    try:
+        for offset, records in decode_file(FILE_NAME, PROCESSES, FSC_MAX_ERRORS, REQUIRE_PREAMBLE,
+                                           PACKED, BIT_ORDER):
+            received = capture_time(offset)
+            for record in records:
+                if dedup is None or not dedup.is_duplicate(record_key(record), received):
+                    sink.write(record)
+            sink.tick()
+    finally:
+        sink.close()
+
+
+def decode_file(file_name, processes=PROCESSES, max_errors=0, require_preamble=True,
+                packed=False, bit_order="msb"):
+    """
+        Decode a capture file on a process pool
+
+        args:
+            file_name - (str) path to the capture
+            processes - (int) number of worker processes
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            packed - (bool) the capture is 8 bits per byte instead of 1
+            bit_order - (str) "msb" or "lsb", where the first bit is in each packed byte
+        yields:
+            (int, dict[]) of the bit offset of each run of batches
+            and the messages in it, in capture order
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        runs = ((file_name, offset, num_batches, max_errors, packed, bit_order)
+                for offset, num_batches in find_runs(file_name, max_errors, require_preamble,
+                                                     packed, bit_order))
+
+        # imap keeps the order runs were found in, and pulls them from the
+        # first pass as workers free up so both passes run at once
+        for result in pool.imap(decode_run, runs, RUNS_PER_TASK):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def find_runs(file_name, max_errors=0, require_preamble=True, packed=False, bit_order="msb"):
+    """
+        First pass, find every run of batches without parsing them
+
+        args:
+            file_name - (str) path to the capture
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            packed - (bool) the capture is 8 bits per byte instead of 1
+            bit_order - (str) "msb" or "lsb", where the first bit is in each packed byte
+        yields:
+            (int, int) of the bit offset of each run and its number of batches
+    """
+    if USE_NUMPY and pocsag_numpy is not None:
+        for offset, batch_words in pocsag_numpy.find_file_transmissions(
+                file_name, max_errors, require_preamble, packed=packed, bit_order=bit_order):
+            yield offset, len(batch_words)
+        return
+
+    conn = FileInterface(file_name, packed=packed, bit_order=bit_order)
+    try:
+        for offset, _, num_batches in find_stream_runs(conn, max_errors, require_preamble):
+            yield offset, num_batches
+    finally:
+        conn.close()
+
+
+def decode_run(run):
+    """
+        Second pass, fully decode one run of batches, runs in a pool process
+
+        args:
+            run - (tuple) of file_name, bit offset, number of batches, max_errors,
+                packed, bit_order
+        returns:
+            (int, dict[]) of the bit offset and a record (see pocsag_sinks) for each message
+    """
+    file_name, offset, num_batches, max_errors, packed, bit_order = run
+    num_bits = BATCH_SIZE * num_batches
+    with open(file_name, mode='rb') as file:
+        if packed:
+            # the run can start part way into a byte
+            skip = offset % 8
+            file.seek(offset // 8)
+            data = file.read((skip + num_bits + 7) // 8)
+        else:
+            file.seek(offset)
+            data = file.read(num_bits)
+
+    # flip bit since high freq is logical 0 and low freq is logical 1
+    if packed:
+        bits = unpack_bits(data, make_unpack_table(bit_order))[skip: skip + num_bits]
+    else:
+        bits = bytearray(data.translate(INVERT_TABLE))
+
+    records = []
+    for message in assemble_messages(group_batches(bits, 0, max_errors), SUBSCRIPTIONS):
+        records.append(make_record(message, CHANNEL))
+    return offset, records
+
+
+if __name__ == "__main__":
+    main()
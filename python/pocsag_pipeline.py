@@ -0,0 +1,148 @@
+"""
+    Module to receive from the UDP sink on its own thread
+
+    While the reader is decoding, nothing reads the socket and the
+    kernel silently drops datagrams once its buffer fills. The
+    ReceivePipeline runs a thread that only drains the socket into a
+    bounded queue, and the decoder pulls chunks off that queue.
+
+    | ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+    | socket -> receiver thread -> queue -> decoder (RingBuffer)   |
+    | ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    If the decoder falls so far behind that the queue is full, new
+    chunks are dropped and counted instead of blocking the receiver.
+    If receiving fails the thread stops, and the error is raised again
+    in the decoder once it has taken every chunk that came before it.
+"""
+import threading
+import traceback
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from ring_buffer import RingBuffer
+from udp_interface import BUFFER_SIZE
+
+QUEUE_SIZE = 1024  # chunks, each is up to read_batch datagrams
+
+
+class ReceivePipeline(object):
+    """
+        Wraps a UdpInterface and looks like one to the decoder
+        (receive, or buffer, read_socket and clean_buffer) so either can be used
+
+        args:
+            conn - (UdpInterface) the socket to drain
+            queue_size - (int) max chunks waiting for the decoder
+            buffer_size - (int) capacity of the decoder side RingBuffer
+    """
+
+    def __init__(self, conn, queue_size=QUEUE_SIZE, buffer_size=BUFFER_SIZE):
+        self.conn = conn
+        self.queue = queue.Queue(queue_size)
+        self.buffer = RingBuffer(buffer_size)
+        self.received_chunks = 0
+        self.received_bits = 0
+        self.dropped_chunks = 0
+        self.high_water = 0  # most chunks that were ever waiting in the queue
+        self.reported_drops = 0
+        self.error = None  # exception that stopped the receiver thread
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the receiver thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._receive_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+            Ask the receiver thread to stop
+            it exits after the next datagram arrives
+        """
+        self.running = False
+
+    def _receive_loop(self):
+        """
+            Body of the receiver thread, drain the socket as fast as possible
+        """
+        while self.running:
+            try:
+                chunk = self.conn.receive()
+            except Exception as err:
+                traceback.print_exc()
+                self.error = err
+                self.running = False
+                # None tells the decoder side, wait for room so it isn't dropped
+                self.queue.put(None)
+                return
+
+            self.received_chunks += 1
+            self.received_bits += len(chunk)
+
+            try:
+                self.queue.put_nowait(chunk)
+            except queue.Full:
+                self.dropped_chunks += 1
+                continue
+
+            depth = self.queue.qsize()
+            if depth > self.high_water:
+                self.high_water = depth
+
+    def read_socket(self):
+        """
+            read the next chunk from the receiver thread into buffer
+            blocks until one is ready
+
+            returns:
+                (bool) True, there is always more data coming from the socket
+        """
+        self.buffer.write(self.receive())
+        return True
+
+    def receive(self):
+        """
+            take the next chunk from the receiver thread without touching the buffer
+            blocks until one is ready, raises the error that stopped the thread
+            if it stopped
+
+            returns:
+                (bytearray) of the flipped bits, one per byte
+        """
+        chunk = self.queue.get()
+        if chunk is None:
+            # leave it for the next call, which has to fail too
+            self.queue.put_nowait(None)
+            raise self.error
+
+        if self.dropped_chunks != self.reported_drops:
+            self.reported_drops = self.dropped_chunks
+            print "receive queue full, dropped chunks:", self.dropped_chunks
+        return chunk
+
+    def clean_buffer(self, last_idx):
+        """
+            remove data that is no longer useful in the buffer
+            everything before last_idx is dropped
+        """
+        self.buffer.consume(last_idx)
+
+    def stats(self):
+        """
+            returns:
+                (dict) of the receive counters
+        """
+        return {
+            "received_chunks": self.received_chunks,
+            "received_bits": self.received_bits,
+            "dropped_chunks": self.dropped_chunks,
+            "queue_depth": self.queue.qsize(),
+            "queue_high_water": self.high_water,
+            "buffer_dropped": self.buffer.dropped,
+        }
@@ -3,21 +3,84 @@
 """
 import socket
 import binascii
-from pocsag_batch import PocsagBatch, contains_fsc
+import time
+from pocsag_batch import PocsagBatch, contains_fsc, bits_to_words
+from pocsag_decoder import PocsagDecoder
+from pocsag_dedup import DedupCache, message_key
+from pocsag_filter import CapcodeFilter
 from pocsag_frame import PocsagIdleFrame, PocsagMessageWord, PocsagAddressWord
 from pocsag_message import PocsagMessage
+from pocsag_metrics import Metrics, Histogram, add_decoder, add_pipeline, add_dedup, add_soft, serve
+from pocsag_pipeline import ReceivePipeline
+from pocsag_sinks import PrintSink, make_record, make_sink
+from pocsag_soft import SoftDecoder, read_samples
+from pocsag_sync import SyncDetector
+from file_interface import FileInterface
 from udp_interface import UdpInterface
 
+try:
+    import pocsag_numpy
+except ImportError:
+    pocsag_numpy = None
+
 FILE_NAME = "./pocsag_bits"
+SYMBOL_RATE = 1200  # Bd of the capture in FILE_NAME, to time the pages in it
 UDP_IP_ADDR = "127.0.0.1"  # localhost
 UDP_PORT = 5125
 PAYLOAD_SIZE = 1472  # default GNURadio payload size (in bytes)
-PREAMBLE = "10"*288
+
+# the flow graph packs 8 bits per byte before the UDP sink, set to False
+# for flow graphs and captures with one bit per byte. BIT_ORDER is "msb"
+# if the first bit is the most significant (GR_MSB_FIRST) or "lsb"
+PACKED = True
+BIT_ORDER = "msb"
+
+# decode the float symbols from clock recovery instead of the sliced bits,
+# the flow graph streams them to SOFT_UDP_PORT (see pocsag_soft). they
+# are used to sync on noisy FSCs and to chase decode codewords BCH can't fix
+SOFT = False
+SOFT_UDP_PORT = 5126
 BATCH_SIZE = 544
 
+# sync settings, allowing bit errors in the FSC and not needing
+# the preamble lets us decode transmissions with a noisy start
+FSC_MAX_ERRORS = 0
+REQUIRE_PREAMBLE = True
+
+# receive on a separate thread so datagrams aren't dropped while decoding
+THREADED = True
+QUEUE_SIZE = 1024
+
 # should we use net or file?
 FROM_FILE = False
 
+# decode files with the vectorized engine in pocsag_numpy when numpy is installed
+USE_NUMPY = True
+
+# serve runtime metrics for Prometheus at http://METRICS_ADDR:METRICS_PORT/metrics
+# while reading from udp, None turns it off
+METRICS_ADDR = "127.0.0.1"  # localhost
+METRICS_PORT = 9125
+
+# where decoded messages go, one of "print", "jsonl" or "sqlite". the file
+# sinks buffer messages and write them every SINK_MAX_RECORDS messages
+# or SINK_MAX_SECONDS seconds, whichever comes first
+SINK = "print"
+OUTPUT_FILE = "./pocsag_messages.jsonl"
+SINK_MAX_RECORDS = 100
+SINK_MAX_SECONDS = 1.0
+CHANNEL = None  # label put on every message
+
+# drop pages that are the same as one seen in the last DEDUP_WINDOW seconds
+# (same capcode, function and payload), remembering at most DEDUP_ENTRIES
+# pages. None turns it off
+DEDUP_WINDOW = 60.0
+DEDUP_ENTRIES = 4096
+
+# only decode messages to these capcodes, None decodes every capcode
+CAPCODES = None
+SUBSCRIPTIONS = None if CAPCODES is None else CapcodeFilter(CAPCODES)
+
 
 def main():
     """Main method"""
@@ -32,92 +95,211 @@ def from_net():
         Main method where we read from udp
     """
     # initialize udp connection
-    conn = UdpInterface(UDP_IP_ADDR, UDP_PORT, PAYLOAD_SIZE)
-    while True:
-        conn.read_socket()
-        # print "conn buffer len", len(conn.buffer)
-
-        # TODO: try looking for only FSCs
-        # it is possible we are getting bit errors during preamble and it's messing us up
-        # hard to say because idk the error rate, but 576 correct in a row seems like a lot
-        idx = 0
-        while idx < len(conn.buffer) - 576:
-
-            bit_slice = conn.buffer[idx: idx + 576]
-            bit_str = ''.join(bit_slice)
+    if SOFT:
+        conn = UdpInterface(UDP_IP_ADDR, SOFT_UDP_PORT, PAYLOAD_SIZE, soft=True)
+    else:
+        conn = UdpInterface(UDP_IP_ADDR, UDP_PORT, PAYLOAD_SIZE, packed=PACKED, bit_order=BIT_ORDER)
+    if THREADED:
+        conn = ReceivePipeline(conn, QUEUE_SIZE)
+        conn.start()
+
+    # every bit goes through the decoder once as it arrives
+    decoder = make_decoder(SUBSCRIPTIONS)
+
+    dedup = make_dedup()
+
+    latency = Histogram()
+    if METRICS_PORT is not None:
+        metrics = Metrics()
+        add_decoder(metrics, decoder)
+        if SOFT:
+            add_soft(metrics, decoder)
+        if THREADED:
+            add_pipeline(metrics, conn)
+        if dedup is not None:
+            add_dedup(metrics, dedup)
+        metrics.histogram("pocsag_decode_latency_seconds",
+                          "Time from a chunk being received to its messages being decoded", latency)
+        serve(metrics, METRICS_ADDR, METRICS_PORT)
+
+    sink = make_sink(SINK, OUTPUT_FILE, SINK_MAX_RECORDS, SINK_MAX_SECONDS)
+    try:
+        while True:
+            chunk = conn.receive()
+            received = time.time()
+            for message in decoder.feed(chunk):
+                if dedup is not None and dedup.is_duplicate(message_key(message), received):
+                    continue
+                sink.write(make_record(message, CHANNEL))
+                latency.observe(time.time() - received)
+            sink.tick()
+    finally:
+        sink.close()
+
+
+def decode_stream(conn, on_batches=None):
+    """
+        Decode loop that works a whole run of batches at a time,
+        runs until conn runs out of data (forever for the network)
 
-            if bit_str == PREAMBLE:
-                idx += 576
+        args:
+            conn - (UdpInterface, ReceivePipeline or FileInterface) where bits come from
+            on_batches - (function) called with the batch[] of each transmission
+                and its bit offset from the start of the stream, defaults to
+                parse_batches
+    """
+    if on_batches is None:
+        on_batches = lambda batches, offset: parse_batches(batches)
 
-                # read in more data from socket so that we get the full message
-                get_batches(conn, idx)
+    for offset, start, _ in find_stream_runs(conn, FSC_MAX_ERRORS, REQUIRE_PREAMBLE):
+        on_batches(group_batches(conn.buffer, start, FSC_MAX_ERRORS), offset)
 
-                batches = group_batches(conn.buffer[idx:])
-                parse_batches(batches)
 
-                # if there were batches, increment by 544 bits per batch
-                # if the batch wasn't valid, only increment by 1
-                if len(batches) != 0:
-                    print len(batches)
-                    idx += BATCH_SIZE * len(batches)
+def find_stream_runs(conn, max_errors=0, require_preamble=True):
+    """
+        Find every run of batches in a stream without parsing them,
+        runs until conn runs out of data (forever for the network)
 
-                    # since we found data, we should remove the previous part of the buffer
-                    # because it will just keep repeating this
-                    conn.clean_buffer(idx)
-                else:
-                    idx += 1
+        args:
+            conn - (UdpInterface, ReceivePipeline or FileInterface) where bits come from
+            max_errors - (int) number of bit errors allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+        yields:
+            (int, int, int) of the bit offset of each run from the start of the
+            stream, its index in conn.buffer and its number of batches. The run
+            stays in conn.buffer until the next one is asked for
+    """
+    detector = SyncDetector(max_errors=max_errors,
+                            require_preamble=require_preamble)
 
+    # idx is how far into conn.buffer the detector has been fed
+    # so every bit is only looked at once
+    idx = 0
+    base = 0  # bit offset in the stream of conn.buffer[0]
+    while conn.read_socket():
+        while idx < len(conn.buffer):
+            # scan the ring buffer's storage directly, the live bits
+            # start at buffer.head and are contiguous
+            buf = conn.buffer
+            offset = detector.find(buf.data, buf.head + idx, buf.head + len(buf))
+            if offset is None:
+                # only keep enough to hold an FSC that started in these bits
+                idx = min(len(buf), 32)
+                base += len(buf) - idx
+                conn.clean_buffer(len(buf) - idx)
+                break
+            offset -= buf.head
+
+            # read in more data from socket so that we get the full message
+            num_batches = get_batches(conn, offset, max_errors)
+
+            # if there were batches, skip 544 bits per batch
+            # if the batch wasn't valid, keep going from the end of the FSC
+            if num_batches != 0:
+                yield base + offset, offset, num_batches
+
+                # since we found data, we should remove the previous part of the buffer
+                # because it will just keep repeating this
+                idx = offset + BATCH_SIZE * num_batches
+                base += idx
+                conn.clean_buffer(idx)
+                idx = 0
+                detector.reset()
             else:
-                idx += 1
+                idx = offset + 32
 
 
 def from_file():
     """
         Main method where we read from file
     """
-    with open(FILE_NAME, mode='rb') as file:
-        byte_arr = bytearray(file.read())
-
-    # NOTE: these are LSB, so we will have to reverse are byte sets to match the codewords
-    bits = []
-    for i in byte_arr:
-        # flip bit since high freq is logical 0 and low freq is logical 1
-        bit = i ^ 1
-        bits.append(str(bit))
-
-     # TODO: try looking for only FSCs
-    # it is possible we are getting bit errors during preamble and it's messing us up
-    # hard to say because idk the error rate, but 576 correct in a row seems like a lot
-    idx = 0
-    while idx < len(bits) - 576:
+    sink = make_sink(SINK, OUTPUT_FILE, SINK_MAX_RECORDS, SINK_MAX_SECONDS)
+    # a file is read much faster than it was received, so pages are timed
+    # by where they are in the capture for the dedup window, not by the clock
+    dedup = make_dedup()
+    try:
+        if SOFT:
+            decode_samples(FILE_NAME, sink, dedup)
+            return
+
+        if USE_NUMPY and pocsag_numpy is not None:
+            for offset, batches in pocsag_numpy.decode_file(
+                    FILE_NAME, FSC_MAX_ERRORS, REQUIRE_PREAMBLE, packed=PACKED, bit_order=BIT_ORDER):
+                parse_batches(batches, sink, dedup, capture_time(offset))
+            return
+
+        conn = FileInterface(FILE_NAME, packed=PACKED, bit_order=BIT_ORDER)
+        try:
+            decode_stream(conn, lambda batches, offset: parse_batches(
+                batches, sink, dedup, capture_time(offset)))
+        finally:
+            conn.close()
+    finally:
+        sink.close()
+
+
+def decode_samples(file_name, sink, dedup=None):
+    """
+        Decode a file of float symbols with the soft decoder
 
-        """"""
-        bit_slice = bits[idx: idx + 576]
-        bit_str = ''.join(bit_slice)
+        args:
+            file_name - (str) path to the file
+            sink - (PrintSink, JsonlSink or SqliteSink) where the records go
+            dedup - (DedupCache) repeats of pages in it are dropped before
+                they're decoded, None keeps every page
+    """
+    decoder = make_decoder(SUBSCRIPTIONS)
+    # a batch at a time, so each page is timed to within a batch
+    for samples in read_samples(file_name, BATCH_SIZE):
+        received = capture_time(decoder.bits + len(samples))
+        for message in decoder.feed(samples):
+            if dedup is not None and dedup.is_duplicate(message_key(message), received):
+                continue
+            sink.write(make_record(message, CHANNEL))
+        sink.tick()
+
+    for message in decoder.flush():
+        if dedup is None or not dedup.is_duplicate(message_key(message), capture_time(decoder.bits)):
+            sink.write(make_record(message, CHANNEL))
+
+
+def capture_time(offset):
+    """
+        args:
+            offset - (int) bit offset in the capture in FILE_NAME
+        returns:
+            (float) seconds from the start of the capture to that bit
+    """
+    return offset / float(SYMBOL_RATE)
 
-        if bit_str == PREAMBLE:
-            # print "found preamble boi"
-            idx += 576
-            batches = group_batches(bits[idx:])
-            parse_batches(batches)
 
-            # if there were batches, increment by 544 bits per batch
-            # if the batch wasn't valid, only increment by 1
-            if len(batches) != 0:
-                print len(batches)
-                idx += BATCH_SIZE * len(batches)
+def make_decoder(subscriptions=None):
+    """
+        args:
+            subscriptions - (CapcodeFilter) only build messages to these capcodes,
+                None for every capcode
+        returns:
+            (PocsagDecoder, or SoftDecoder if SOFT) for the sync settings
+    """
+    if SOFT:
+        return SoftDecoder(FSC_MAX_ERRORS, REQUIRE_PREAMBLE, subscriptions)
+    return PocsagDecoder(FSC_MAX_ERRORS, REQUIRE_PREAMBLE, subscriptions)
 
-            else:
-                idx += 1
 
-        else:
-            idx += 1
+def make_dedup():
+    """
+        returns:
+            (DedupCache) for the DEDUP settings, None if it's turned off
+    """
+    if DEDUP_WINDOW is None:
+        return None
+    return DedupCache(DEDUP_WINDOW, DEDUP_ENTRIES)
 
 
-def get_batches(conn, end_of_preamble):
+def get_batches(conn, start_of_batches, max_errors=0):
     """
         Function to keep receiving data from the socket after
-        we have found the preamble
+        we have found the first FSC
 
         This is necessary because it's likely we haven't received
         the full message with the preamble, so we need to keep getting
@@ -128,55 +310,56 @@ def get_batches(conn, end_of_preamble):
 
         args:
             conn - (UdpInterface)
-            end_of_preamble - (int) index of where we are in conn.buffer
+            start_of_batches - (int) index of where we are in conn.buffer
+            max_errors - (int) number of bit errors allowed in each FSC
+        returns:
+            (int) number of full batches in a row from start_of_batches
     """
-    end_of_batches = False
-    idx = end_of_preamble
+    num_batches = 0
+    idx = start_of_batches
 
-    while not end_of_batches:
-        # fsc is 32 bits. if we are within that, we need more data
-        if idx >= len(conn.buffer) - 32:
+    while True:
+        # need the full batch in the buffer before we look at the next one
+        while idx + BATCH_SIZE > len(conn.buffer):
             # print "reading more data"
-            conn.read_socket()
+            if not conn.read_socket():
+                return num_batches
 
-        batch = conn.buffer[idx: idx + BATCH_SIZE]
-        batch_str = ''.join(batch)
-
-        if contains_fsc(batch_str):
-            # print "contains fsc"
-            idx += BATCH_SIZE
+        if not contains_fsc(conn.buffer[idx: idx + 32], max_errors):
+            return num_batches
 
-        else:
-            end_of_batches = True
+        # print "contains fsc"
+        num_batches += 1
+        idx += BATCH_SIZE
 
 
-def group_batches(bits):
+def group_batches(bits, start=0, max_errors=0):
     """
-        Group batches once a preamble is identified
+        Group batches once a sync is identified
 
         args:
-            bits - (array) slice of bits from end of preamble to end
+            bits - (int[]) of 0/1 bits
+            start - (int) index of the first batch's FSC in bits
+            max_errors - (int) number of bit errors allowed in each FSC
         returns:
             batch[]
     """
     batches = []
     valid_batches = True
-    num_batches = 0
+    idx = start
 
     # just keep taking 544 bit slices and batch them
     # if each subsequent batch is valid, keep doing it
-    # if not, break
-    while valid_batches:
-        batch_bits = bits[num_batches *
-                          BATCH_SIZE: (num_batches + 1) * BATCH_SIZE]
-        batch_bits = ''.join(batch_bits)
+    # if not, or we run out of bits, break
+    while valid_batches and idx + BATCH_SIZE <= len(bits):
+        batch_words = bits_to_words(bits[idx: idx + BATCH_SIZE])
 
-        batch = PocsagBatch(batch_bits)
+        batch = PocsagBatch(batch_words, max_errors)
 
         if batch.is_valid:
             batch.parse_frames()
             batches.append(batch)
-            num_batches += 1
+            idx += BATCH_SIZE
         else:
             # print "invalid batch"
             valid_batches = False
@@ -184,10 +367,33 @@ def group_batches(bits):
     return batches
 
 
-def parse_batches(batches):
+def parse_batches(batches, sink=None, dedup=None, received=None):
     """
         Function to parse a list of batches
-        Will print any data found on it
+        Will write a record for every message found on it to sink
+
+        arg:
+            (batch[]) - list of batches from one preamble
+            sink - (PrintSink, JsonlSink or SqliteSink) where the records go,
+                defaults to printing them
+            dedup - (DedupCache) repeats of pages in it are dropped before
+                they're decoded, None keeps every page
+            received - (float) time the batches were received for dedup,
+                defaults to now
+    """
+    if sink is None:
+        sink = PrintSink()
+
+    for message in assemble_messages(batches, SUBSCRIPTIONS):
+        if dedup is not None and dedup.is_duplicate(message_key(message), received):
+            continue
+        sink.write(make_record(message, CHANNEL))
+    sink.tick()
+
+
+def assemble_messages(batches, subscriptions=None):
+    """
+        Function to combine the codewords in a list of batches into messages
 
         Messages in pocsag start with an address (or idle frames then an address)
         after that, there are messages until the batch ends or messages followed by idle frames
@@ -196,49 +402,49 @@ def parse_batches(batches):
 
         arg:
             (batch[]) - list of batches from one preamble
+            subscriptions - (CapcodeFilter) only build messages to these capcodes,
+                None for every capcode
+        returns:
+            (PocsagMessage[]) the messages found, not decoded yet
     """
-    # first, get all the data together
-    # iterate through each batch and combine all the Pocsag messages
-    # then print out ascii characters
-    # will figure out what to do with addresses
-    print "******** NEW PREAMBLE *************"
-    flattened_codewords = []
-    for batch in batches:
-        for frame in batch.frames:
-            for codeword in frame.codewords:
-                flattened_codewords.append(codeword)
-                # print type(codeword)
-
     messages = []
     curr_message = None
 
     in_message = False
-    for codeword in flattened_codewords:
-        # addresses are the start of messages
-        if in_message is False and isinstance(codeword, PocsagAddressWord):
-            in_message = True
-            curr_message = PocsagMessage(codeword)
-
-        # another address is start of new message
-        elif in_message is True and isinstance(codeword, PocsagAddressWord):
-            messages.append(curr_message)
-            curr_message = PocsagMessage(codeword)
-
-        # end of message
-        elif in_message is True and isinstance(codeword, PocsagIdleFrame):
-            # NOTE: might have to append copy not curr_message directly
-            in_message = False
-            messages.append(curr_message)
-            curr_message = None
-
-        # add to the message
-        elif in_message is True and isinstance(codeword, PocsagMessageWord):
-            curr_message.add_payload(codeword)
-
-    # read through message objs
-    for message in messages:
-        print "NEW MESSAGE"
-        message.read_alphanum()
+    for batch in batches:
+        for frame in batch.frames:
+            # no subscribed address can be in this frame, so unless it carries
+            # on a message its codewords are never made (or BCH corrected)
+            if in_message is False and subscriptions is not None and \
+                    not subscriptions.wants_frame(frame.frame_pos):
+                continue
+
+            for codeword in frame.codewords:
+                # addresses are the start of messages
+                if isinstance(codeword, PocsagAddressWord):
+                    # another address is start of new message
+                    if in_message is True:
+                        messages.append(curr_message)
+
+                    # messages to other capcodes are skipped
+                    in_message = subscriptions is None or subscriptions.wants(codeword)
+                    curr_message = PocsagMessage(codeword) if in_message else None
+
+                # end of message
+                elif in_message is True and isinstance(codeword, PocsagIdleFrame):
+                    in_message = False
+                    messages.append(curr_message)
+                    curr_message = None
+
+                # add to the message
+                elif in_message is True and isinstance(codeword, PocsagMessageWord):
+                    curr_message.add_payload(codeword)
+
+    # the batches ending also ends the message
+    if in_message is True:
+        messages.append(curr_message)
+
+    return messages
 
 
 if __name__ == "__main__":
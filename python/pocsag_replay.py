@@ -0,0 +1,233 @@
+"""
+    Program to stand in for the GNU Radio flow graph on a box with no radio
+
+    It can send a capture file (recorded from the UDP sink or made with
+    pocsag_encoder) to the reader's UDP port in the same size datagrams
+    the udp_sink block sends (DATAGRAM_SIZE), paced at the symbol rate,
+    some multiple of it, or as fast as it can.
+
+    It can also record whatever arrives on a UDP port to disk. Each
+    datagram is stored with the time it arrived
+
+    | ++++++++++++++++++++++++++++++++++++++++++++++++ |
+    | 8 bytes          | 4 bytes          | n bytes    |
+    | seconds (double) | n (unsigned int) | datagram   |
+    | ++++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    with the seconds counted from the first datagram, so a recording can
+    be sent again with its original timing.
+
+    Together they give repeatable end to end tests of UdpInterface and
+    from_net(), where the number of datagrams sent can be checked
+    against what the reader received.
+"""
+import mmap
+import socket
+import struct
+import time
+
+from pocsag_reader import UDP_IP_ADDR, UDP_PORT, PAYLOAD_SIZE, PACKED, SOFT, SOFT_UDP_PORT
+from udp_interface import SAMPLE_SIZE
+
+# "send" a capture, "record" a UDP stream or "resend" a recording
+MODE = "send"
+FILE_NAME = "./pocsag_bits"
+RECORD_FILE = "./pocsag_recording"
+SYMBOL_RATE = 1200  # Bd
+SPEED = 1.0  # multiple of the symbol rate, 0 sends as fast as possible
+# bits in each datagram the flow graph sends, BITS_PER_BYTE is the bits in
+# each byte of the capture. soft datagrams are a full PAYLOAD_SIZE of
+# float32s (368 symbols) instead
+BITS_PER_DATAGRAM = 1472
+if SOFT:
+    BITS_PER_BYTE = 1.0 / SAMPLE_SIZE
+    DATAGRAM_SIZE = PAYLOAD_SIZE
+else:
+    BITS_PER_BYTE = 8 if PACKED else 1
+    DATAGRAM_SIZE = BITS_PER_DATAGRAM // BITS_PER_BYTE
+PORT = SOFT_UDP_PORT if SOFT else UDP_PORT
+RECORD_SECONDS = None  # how long to record for, None until ctrl-c
+
+RECORD_HEADER = struct.Struct("<dI")  # arrival time, datagram size
+
+
+def main():
+    """Main method"""
+    try:
+        if MODE == "send":
+            stats = send_capture(FILE_NAME, UDP_IP_ADDR, PORT, DATAGRAM_SIZE,
+                                 SYMBOL_RATE, SPEED, BITS_PER_BYTE)
+        elif MODE == "resend":
+            stats = send_recording(RECORD_FILE, UDP_IP_ADDR, PORT, SPEED)
+        elif MODE == "record":
+            stats = record(RECORD_FILE, UDP_IP_ADDR, PORT, PAYLOAD_SIZE, RECORD_SECONDS)
+        else:
+            raise ValueError("unknown mode %r" % MODE)
+    except KeyboardInterrupt:
+        return
+
+    print "%s: %s" % (MODE, stats)
+
+
+def send_capture(file_name, addr, port, payload_size=PAYLOAD_SIZE,
+                 symbol_rate=SYMBOL_RATE, speed=SPEED, bits_per_byte=1):
+    """
+        Send a capture file over UDP like the udp_sink block
+
+        args:
+            file_name - (str) path to the capture
+            addr - (str) address the reader listens on
+            port - (int) port the reader listens on
+            payload_size - (int) bytes per datagram
+            symbol_rate - (int) baud rate to pace the bits at
+            speed - (float) multiple of symbol_rate, 0 sends as fast as possible
+            bits_per_byte - (float) 1 for one bit per byte, 8 for packed bits,
+                0.25 for float32 soft symbols
+        returns:
+            (dict) of the datagrams and bytes sent and the seconds it took
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with open(file_name, mode='rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            data = ""
+
+        # seconds per byte of the capture, 0 for no pacing
+        byte_time = bits_per_byte / float(symbol_rate * speed) if speed else 0
+
+        datagrams = 0
+        started = time.time()
+        for pos in range(0, len(data), payload_size):
+            if byte_time:
+                # pace on the total sent so sleep overshoot doesn't add up
+                delay = started + pos * byte_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            sock.sendto(data[pos: pos + payload_size], (addr, port))
+            datagrams += 1
+
+        elapsed = time.time() - started
+        sent = len(data)
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    sock.close()
+    return {
+        "datagrams": datagrams,
+        "bytes": sent,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def record(file_name, addr, port, payload_size=PAYLOAD_SIZE, seconds=None):
+    """
+        Write every datagram that arrives on a port to a recording
+
+        args:
+            file_name - (str) path to write the recording to
+            addr - (str) address to listen on
+            port - (int) port to listen on
+            payload_size - (int) largest datagram expected
+            seconds - (float) how long to record for after the first
+                datagram, None for until ctrl-c
+        returns:
+            (dict) of the datagrams and bytes recorded and the seconds it took
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((addr, port))
+
+    datagrams = 0
+    received = 0
+    started = None
+    now = None
+    with open(file_name, mode='wb') as file:
+        try:
+            while True:
+                if started is not None and seconds is not None:
+                    remaining = started + seconds - time.time()
+                    if remaining <= 0:
+                        break
+                    sock.settimeout(remaining)
+
+                try:
+                    datagram = sock.recv(payload_size)
+                except socket.timeout:
+                    break
+
+                now = time.time()
+                if started is None:
+                    started = now
+
+                file.write(RECORD_HEADER.pack(now - started, len(datagram)))
+                file.write(datagram)
+                datagrams += 1
+                received += len(datagram)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sock.close()
+
+    return {
+        "datagrams": datagrams,
+        "bytes": received,
+        "seconds": round(now - started, 3) if started is not None else 0,
+    }
+
+
+def read_recording(file_name):
+    """
+        Read back a recording made by record()
+
+        args:
+            file_name - (str) path to the recording
+        yields:
+            (float, str) of the seconds each datagram arrived at and its bytes
+    """
+    with open(file_name, mode='rb') as file:
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            arrived, size = RECORD_HEADER.unpack(header)
+            yield arrived, file.read(size)
+
+
+def send_recording(file_name, addr, port, speed=SPEED):
+    """
+        Send a recording again with the timing it was recorded with
+
+        args:
+            file_name - (str) path to the recording
+            addr - (str) address the reader listens on
+            port - (int) port the reader listens on
+            speed - (float) how many times faster than it was recorded,
+                0 sends as fast as possible
+        returns:
+            (dict) of the datagrams and bytes sent and the seconds it took
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    datagrams = 0
+    sent = 0
+    started = time.time()
+    for arrived, datagram in read_recording(file_name):
+        if speed:
+            delay = started + arrived / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        sock.sendto(datagram, (addr, port))
+        datagrams += 1
+        sent += len(datagram)
+
+    sock.close()
+    return {
+        "datagrams": datagrams,
+        "bytes": sent,
+        "seconds": round(time.time() - started, 3),
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+    Program to decode several POCSAG channels at once
+
+    Each channel is its own GNU Radio flow graph streaming to its own
+    UDP port. The supervisor runs one decoder per channel on a process
+    pool, so a busy or noisy channel only uses up its own process and
+    can't hold up reception on the others. Every decoder has its own
+    socket, receiver thread and queue (see pocsag_pipeline).
+
+    Decoded messages and per channel health stats come back on one
+    queue. Messages, tagged with the channel label, all go to one sink
+    (see pocsag_sinks) and the stats are printed.
+
+    Each decoder drops repeats of pages on its own channel before
+    decoding them, and the supervisor drops pages that already came in
+    on another channel (see pocsag_dedup).
+"""
+import multiprocessing
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from pocsag_dedup import message_key, record_key
+from pocsag_filter import CapcodeFilter
+from pocsag_pipeline import ReceivePipeline
+from pocsag_reader import UDP_IP_ADDR, PAYLOAD_SIZE, QUEUE_SIZE, SINK, OUTPUT_FILE, \
+    SINK_MAX_RECORDS, SINK_MAX_SECONDS, PACKED, BIT_ORDER, SOFT, make_decoder, make_dedup
+from pocsag_sinks import make_record, make_sink
+from udp_interface import UdpInterface
+
+STATS_INTERVAL = 60  # seconds between health reports
+
+
+class Channel(object):
+    """
+        Definition of one channel to decode
+
+        args:
+            label - (str) name used to tag the output
+            port - (int) UDP port the flow graph streams to
+            symbol_rate - (int) baud rate of the channel (600, 1200 or 2400)
+            addr - (str) address to listen on
+            capcodes - (int[]) only decode messages to these capcodes,
+                None decodes every capcode
+    """
+
+    def __init__(self, label, port, symbol_rate, addr=UDP_IP_ADDR, capcodes=None):
+        self.label = label
+        self.port = port
+        self.symbol_rate = symbol_rate
+        self.addr = addr
+        self.capcodes = capcodes
+
+
+# edit these to match the flow graphs that are running
+CHANNELS = [
+    Channel("152.180 MHz", 5125, 1200),
+]
+
+
+def run_channel(channel, results):
+    """
+        Decode one channel forever, runs in a pool process
+
+        Puts ("message", label, record) for every message and
+        ("stats", label, stats) every STATS_INTERVAL seconds on results
+
+        args:
+            channel - (Channel) what to decode
+            results - (Queue) shared with the supervisor
+    """
+    conn = ReceivePipeline(
+        UdpInterface(channel.addr, channel.port, PAYLOAD_SIZE, packed=PACKED, bit_order=BIT_ORDER,
+                     soft=SOFT),
+        QUEUE_SIZE)
+    conn.start()
+
+    subscriptions = None if channel.capcodes is None else CapcodeFilter(channel.capcodes)
+    decoder = make_decoder(subscriptions)
+    dedup = make_dedup()
+    started = time.time()
+
+    def report_stats():
+        while True:
+            time.sleep(STATS_INTERVAL)
+            stats = conn.stats()
+            stats["batches"] = decoder.batches
+            stats["messages"] = decoder.messages
+            if dedup is not None:
+                stats.update(dedup.stats())
+            elapsed = time.time() - started
+            stats["uptime"] = int(elapsed)
+            # ratio of bits received to the symbol rate, ~1.0 when the
+            # flow graph is streaming in real time
+            stats["rate_ratio"] = round(
+                stats["received_bits"] / (elapsed * channel.symbol_rate), 3)
+            results.put(("stats", channel.label, stats))
+
+    reporter = threading.Thread(target=report_stats)
+    reporter.daemon = True
+    reporter.start()
+
+    while True:
+        for message in decoder.feed(conn.receive()):
+            if dedup is not None and dedup.is_duplicate(message_key(message)):
+                continue
+            results.put(("message", channel.label, make_record(message, channel.label)))
+
+
+def main(channels=CHANNELS):
+    """
+        Start a decoder for every channel and print what they send back
+
+        args:
+            channels - (Channel[]) the channels to decode
+    """
+    manager = multiprocessing.Manager()
+    results = manager.Queue()
+    pool = multiprocessing.Pool(len(channels))
+
+    sink = make_sink(SINK, OUTPUT_FILE, SINK_MAX_RECORDS, SINK_MAX_SECONDS)
+    # the same page on several channels
+    dedup = make_dedup()
+
+    running = {}
+    for channel in channels:
+        running[channel.label] = pool.apply_async(
+            run_channel, (channel, results))
+
+    try:
+        while running:
+            try:
+                kind, label, data = results.get(timeout=1)
+            except queue.Empty:
+                kind = None
+            sink.tick()
+
+            if kind == "message":
+                if dedup is None or not dedup.is_duplicate(record_key(data), data["timestamp"]):
+                    sink.write(data)
+            elif kind == "stats":
+                print "[%s] stats %s" % (label, data)
+
+            # decoders only return if something went wrong
+            for label, result in running.items():
+                if result.ready():
+                    del running[label]
+                    try:
+                        result.get()
+                    except Exception as err:
+                        print "[%s] decoder stopped: %r" % (label, err)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+    Module with the sinks decoded messages are written to
+
+    Every message becomes a record (a dict) with
+
+    | ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+    | capcode | function | type | text | timestamp | channel | errors | uncorrectable |
+    | ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    where errors is the number of bits BCH correction fixed in the message
+    and uncorrectable the number of its codewords that couldn't be fixed.
+
+    Sinks have write(record), tick() and close(). Printing every message
+    as it's decoded blocks the decoder on the console, so the file sinks
+    buffer records and write them all at once when max_records have
+    built up or the oldest has waited max_seconds. tick() is called
+    between chunks so a quiet channel still gets its records written.
+
+    - PrintSink: one line per message on stdout
+    - JsonlSink: one JSON object per line, appended to a file
+    - SqliteSink: rows in a SQLite table, one commit per write
+"""
+import json
+import sqlite3
+import time
+
+SINK_TYPES = ["print", "jsonl", "sqlite"]
+MAX_RECORDS = 100  # records buffered before they're written
+MAX_SECONDS = 1.0  # longest a record is buffered for
+
+
+def make_record(message, channel=None, timestamp=None):
+    """
+        Make the record for a decoded message
+
+        args:
+            message - (PocsagMessage) the message, it gets decoded if it isn't yet
+            channel - (str) label of the channel it came in on
+            timestamp - (float) unix time it was decoded, defaults to now
+        returns:
+            (dict) the record
+    """
+    return {
+        "capcode": message.address.capcode,
+        "function": message.address.function,
+        "type": message.message_type,
+        "text": message.message_out,
+        "timestamp": time.time() if timestamp is None else timestamp,
+        "channel": channel,
+        "errors": message.errors,
+        "uncorrectable": message.uncorrectable,
+    }
+
+
+def make_sink(sink_type, file_name=None, max_records=MAX_RECORDS, max_seconds=MAX_SECONDS):
+    """
+        Make a sink by name
+
+        args:
+            sink_type - (str) one of SINK_TYPES
+            file_name - (str) file for the jsonl and sqlite sinks
+            max_records - (int) records buffered before they're written
+            max_seconds - (float) longest a record is buffered for
+        returns:
+            (PrintSink, JsonlSink or SqliteSink)
+    """
+    if sink_type == "print":
+        return PrintSink()
+    elif sink_type == "jsonl":
+        return JsonlSink(file_name, max_records, max_seconds)
+    elif sink_type == "sqlite":
+        return SqliteSink(file_name, max_records, max_seconds)
+    raise ValueError("unknown sink type %r" % sink_type)
+
+
+class PrintSink(object):
+    """
+        Prints each record as it comes in
+    """
+
+    def write(self, record):
+        """
+            args:
+                record - (dict) from make_record
+        """
+        line = "%07d %d: %s" % (record["capcode"], record["function"], record["text"])
+        if record["channel"] is not None:
+            line = "[%s] %s" % (record["channel"], line)
+        print line
+
+    def tick(self):
+        """Nothing is buffered"""
+        pass
+
+    def close(self):
+        """Nothing to close"""
+        pass
+
+
+class BufferedSink(object):
+    """
+        Base class for sinks that write records in batches
+
+        args:
+            max_records - (int) records buffered before they're written
+            max_seconds - (float) longest a record is buffered for
+    """
+
+    def __init__(self, max_records=MAX_RECORDS, max_seconds=MAX_SECONDS):
+        self.max_records = max_records
+        self.max_seconds = max_seconds
+        self.records = []
+        self.oldest = None  # when the first buffered record came in
+        self.written = 0  # records written out
+
+    def write(self, record):
+        """
+            Buffer a record, writing them all out if the buffer is full
+
+            args:
+                record - (dict) from make_record
+        """
+        if not self.records:
+            self.oldest = time.time()
+        self.records.append(record)
+
+        if len(self.records) >= self.max_records:
+            self.flush()
+
+    def tick(self):
+        """
+            Write the buffered records out if the oldest has waited max_seconds
+        """
+        if self.records and time.time() - self.oldest >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+            Write every buffered record out now
+        """
+        if self.records:
+            self._write_records(self.records)
+            self.written += len(self.records)
+            self.records = []
+
+    def close(self):
+        """
+            Write anything still buffered and close the file
+        """
+        self.flush()
+        self._close()
+
+    def _write_records(self, records):
+        raise NotImplementedError(
+            'BufferedSink is an abstract class, use JsonlSink or SqliteSink instead')
+
+    def _close(self):
+        raise NotImplementedError(
+            'BufferedSink is an abstract class, use JsonlSink or SqliteSink instead')
+
+
+class JsonlSink(BufferedSink):
+    """
+        Appends records to a file, one JSON object per line
+
+        args:
+            file_name - (str) path of the file
+            max_records - (int) records buffered before they're written
+            max_seconds - (float) longest a record is buffered for
+    """
+
+    def __init__(self, file_name, max_records=MAX_RECORDS, max_seconds=MAX_SECONDS):
+        super(JsonlSink, self).__init__(max_records, max_seconds)
+        self.file = open(file_name, mode='a')
+
+    def _write_records(self, records):
+        self.file.write("".join(json.dumps(record, sort_keys=True) + "\n"
+                                for record in records))
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+
+class SqliteSink(BufferedSink):
+    """
+        Inserts records into the messages table of a SQLite database,
+        every batch of records is one transaction
+
+        args:
+            file_name - (str) path of the database
+            max_records - (int) records buffered before they're written
+            max_seconds - (float) longest a record is buffered for
+    """
+    COLUMNS = ["timestamp", "channel", "capcode", "function", "type", "text",
+               "errors", "uncorrectable"]
+
+    def __init__(self, file_name, max_records=MAX_RECORDS, max_seconds=MAX_SECONDS):
+        super(SqliteSink, self).__init__(max_records, max_seconds)
+        self.conn = sqlite3.connect(file_name)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY, timestamp REAL, channel TEXT, capcode INTEGER, "
+            "function INTEGER, type TEXT, text TEXT, errors INTEGER, uncorrectable INTEGER)")
+        self.conn.commit()
+        self.insert = "INSERT INTO messages (%s) VALUES (%s)" % (
+            ", ".join(self.COLUMNS), ", ".join("?" * len(self.COLUMNS)))
+
+    def _write_records(self, records):
+        self.conn.executemany(self.insert, [
+            [record[column] for column in self.COLUMNS] for record in records])
+        self.conn.commit()
+
+    def _close(self):
+        self.conn.close()
@@ -0,0 +1,278 @@
+"""
+    Module to decode soft symbols instead of sliced bits
+
+    The binary slicer in the flow graph turns every symbol into a 0 or 1
+    and throws away how sure it was. If the flow graph also streams the
+    floats from clock recovery (before the slicer), each bit comes with
+    a reliability, the size of its sample: a bit near 0 was a coin toss,
+    a big one almost certainly right. Bits are decided the way the slicer
+    (and the flip after it) would, so a negative sample is a logical 1.
+
+    The reliabilities are used in 2 places:
+
+    - sync: an FSC with more bit errors than the hard limit still counts
+      if the bits that are wrong were all unreliable. The soft distance
+      is the reliability of the wrong bits over the average reliability
+      of the word, so it's about the number of errors a confident bit
+      would make. Up to SOFT_SYNC_CANDIDATE_ERRORS wrong bits are looked
+      at, and kept if their soft distance is at most SOFT_SYNC_DISTANCE.
+    - chase decoding: when BCH can't fix a codeword, the CHASE_BITS least
+      reliable bits are flipped in every combination, cheapest first,
+      and each try is BCH corrected again. Of the tries that correct,
+      the one that changed the least reliability wins. At most
+      CHASE_MAX_TRIALS tries are made per codeword, so a burst of noise
+      only costs a fixed amount of CPU per codeword.
+
+    Samples come in as float32s in the machine's byte order, the way the
+    UDP and file sinks send them.
+"""
+from pocsag_batch import FRAME_SYNC_CODE
+from pocsag_bch import correct, popcount, UNCORRECTABLE
+from pocsag_decoder import PocsagDecoder
+from pocsag_sync import SyncDetector, PREAMBLE_LEN
+from udp_interface import SAMPLE_SIZE, to_samples
+
+SOFT_SYNC_CANDIDATE_ERRORS = 4  # most wrong FSC bits looked at
+SOFT_SYNC_DISTANCE = 1.5  # most soft distance an FSC can be off by
+CHASE_BITS = 4  # least reliable bits of a codeword that get flipped
+CHASE_MAX_TRIALS = 16  # most tries per codeword
+CHUNK_SAMPLES = 1 << 16  # samples per read from a file
+
+
+def read_samples(file_name, chunk_samples=CHUNK_SAMPLES):
+    """
+        Read a file of float32 samples a chunk at a time
+
+        args:
+            file_name - (str) path to the file
+            chunk_samples - (int) samples per chunk
+        yields:
+            (array) of samples
+    """
+    with open(file_name, mode='rb') as file:
+        while True:
+            data = file.read(chunk_samples * SAMPLE_SIZE)
+            if not data:
+                return
+            yield to_samples(data)
+
+
+def soft_distance(diff, reliability, start=0):
+    """
+        How far a word is from the one it should be, counting each
+        wrong bit by how reliable it was
+
+        args:
+            diff - (int) 32 bit mask of the wrong bits, bit 31 is the first bit
+            reliability - (float[]) reliability of every bit
+            start - (int) index in reliability of the word's first bit
+        returns:
+            (float) the reliability of the wrong bits over the average
+            reliability of the word
+    """
+    word = reliability[start: start + 32]
+    total = sum(word)
+    if total == 0:
+        return float(popcount(diff))
+
+    wrong = 0.0
+    for pos in range(32):
+        if diff & (1 << (31 - pos)):
+            wrong += word[pos]
+    return 32 * wrong / total
+
+
+def chase_patterns(reliability, start=0, chase_bits=CHASE_BITS, max_trials=CHASE_MAX_TRIALS):
+    """
+        The bit flips to try on a codeword, cheapest first
+
+        args:
+            reliability - (float[]) reliability of every bit
+            start - (int) index in reliability of the codeword's first bit
+            chase_bits - (int) number of least reliable bits to flip
+            max_trials - (int) most patterns to make
+        returns:
+            ((float, int)[]) of the reliability each pattern flips and the
+            32 bit pattern
+    """
+    word = reliability[start: start + 32]
+    least = sorted(range(32), key=word.__getitem__)[:chase_bits]
+
+    patterns = []
+    for subset in range(1, 1 << len(least)):
+        cost = 0.0
+        pattern = 0
+        for bit, pos in enumerate(least):
+            if subset & (1 << bit):
+                cost += word[pos]
+                pattern |= 1 << (31 - pos)
+        patterns.append((cost, pattern))
+    patterns.sort()
+    return patterns[:max_trials]
+
+
+class SoftSyncDetector(SyncDetector):
+    """
+        SyncDetector that also takes FSCs with more than max_errors
+        wrong bits if the wrong bits were unreliable
+
+        The decoder sets reliability and offset before each find(), so
+        bits[i] has the reliability reliability[offset + i]. Without
+        reliabilities it's the same as SyncDetector.
+
+        args:
+            preamble_len - (int) number of alternating bits needed before the FSC
+            max_errors - (int) number of bit errors always allowed in the FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            candidate_errors - (int) most wrong bits an FSC can have
+            max_distance - (float) most soft distance an FSC can be off by
+    """
+
+    def __init__(self, preamble_len=PREAMBLE_LEN, max_errors=0, require_preamble=True,
+                 candidate_errors=SOFT_SYNC_CANDIDATE_ERRORS, max_distance=SOFT_SYNC_DISTANCE):
+        # the base detector finds every candidate, find() sorts them out
+        super(SoftSyncDetector, self).__init__(
+            preamble_len, max(max_errors, candidate_errors), require_preamble)
+        self.hard_errors = max_errors
+        self.max_distance = max_distance
+        self.reliability = None
+        self.offset = 0
+        self.soft_syncs = 0  # syncs that needed the reliabilities
+        self.rejected_syncs = 0  # FSCs that were too far off
+
+    def find(self, bits, start=0, end=None):
+        """
+            Feed bits[start:end] through the detector until a sync is found,
+            see SyncDetector.find
+
+            returns:
+                (int) index in bits where the batch (its FSC) starts,
+                or None if every bit up to end was fed without a sync
+        """
+        if end is None:
+            end = len(bits)
+
+        while True:
+            found = super(SoftSyncDetector, self).find(bits, start, end)
+            if found is None:
+                return None
+
+            diff = self.register ^ FRAME_SYNC_CODE
+            if popcount(diff) <= self.hard_errors:
+                return found
+            if self.reliability is not None and \
+                    soft_distance(diff, self.reliability, self.offset + found) <= self.max_distance:
+                self.soft_syncs += 1
+                return found
+
+            # too far off, carry on after it
+            self.syncs -= 1
+            self.rejected_syncs += 1
+            start = found + 32
+
+
+class SoftDecoder(PocsagDecoder):
+    """
+        PocsagDecoder fed float samples, that uses their reliabilities
+        to sync and to correct codewords BCH can't
+
+        args:
+            max_errors - (int) number of bit errors always allowed in each FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble
+            subscriptions - (CapcodeFilter) only build messages to these capcodes,
+                None for every capcode
+            chase_bits - (int) least reliable bits of a codeword that get flipped
+            max_trials - (int) most tries per codeword
+    """
+
+    def __init__(self, max_errors=0, require_preamble=True, subscriptions=None,
+                 chase_bits=CHASE_BITS, max_trials=CHASE_MAX_TRIALS):
+        super(SoftDecoder, self).__init__(max_errors, require_preamble, subscriptions)
+        self.detector = SoftSyncDetector(max_errors=max_errors,
+                                         require_preamble=require_preamble)
+        self.chase_bits = chase_bits
+        self.max_trials = max_trials
+        self.reliability = []  # reliabilities of the bits being fed, after the last 32 before them
+        self.offset = 0  # index in reliability of the first bit being fed
+        self.chase_trials = 0  # chase tries made
+        self.chase_corrected = 0  # codewords fixed by chase decoding
+
+    def feed(self, samples):
+        """
+            Push samples through the decoder
+
+            args:
+                samples - (float[]) symbols from clock recovery
+            returns:
+                (PocsagMessage[]) messages that finished in these samples, not decoded yet
+        """
+        # the last word can have started in the samples before these
+        tail = self.reliability[-32:]
+        self.reliability = tail + [abs(sample) for sample in samples]
+        self._set_offset(len(tail))
+        return PocsagDecoder.feed(self, bytearray(sample < 0 for sample in samples))
+
+    def _set_offset(self, offset):
+        """
+            args:
+                offset - (int) index in reliability of the first bit being fed
+        """
+        self.offset = offset
+        self.detector.reliability = self.reliability
+        self.detector.offset = offset
+
+    def _is_fsc(self, word):
+        """
+            Same as PocsagDecoder, but an FSC that's further off
+            counts if its soft distance is small enough
+        """
+        diff = word ^ FRAME_SYNC_CODE
+        errors = popcount(diff)
+        if errors <= self.max_errors:
+            return True
+        return errors <= self.detector.max_errors and soft_distance(
+            diff, self.reliability, self.offset + self.word_end - 32) <= self.detector.max_distance
+
+    def _correct(self, word):
+        """
+            BCH correct a codeword, chase decoding it if that fails
+        """
+        fixed, errors = correct(word)
+        if errors != UNCORRECTABLE:
+            return fixed, errors
+
+        reliability = self.reliability
+        start = self.offset + self.word_end - 32
+        best = None
+        best_cost = None
+        for _, pattern in chase_patterns(reliability, start, self.chase_bits, self.max_trials):
+            self.chase_trials += 1
+            candidate, candidate_errors = correct(word ^ pattern)
+            if candidate_errors == UNCORRECTABLE:
+                continue
+
+            # what every flipped bit, tried or corrected, was worth
+            flipped = word ^ candidate
+            cost = 0.0
+            for pos in range(32):
+                if flipped & (1 << (31 - pos)):
+                    cost += reliability[start + pos]
+            if best is None or cost < best_cost:
+                best = candidate
+                best_cost = cost
+
+        if best is None:
+            return word, UNCORRECTABLE
+        self.chase_corrected += 1
+        return best, popcount(word ^ best)
+
+    def _refeed_word(self, word):
+        """
+            Same as PocsagDecoder, with the bits' reliabilities lined up
+        """
+        offset = self.offset
+        self._set_offset(offset + self.word_end - 32)
+        try:
+            return super(SoftDecoder, self)._refeed_word(word)
+        finally:
+            self._set_offset(offset)
@@ -0,0 +1,142 @@
+"""
+    Module to find where batches start in a stream of bits
+
+    Keeps a rolling 32 bit shift register of the last bits seen
+    and the length of the current run of alternating bits, so each
+    bit costs O(1) no matter how long the stream is.
+
+    A transmission looks like this
+
+    | +++++++++++++++++++++++++++++++++++++++++++++++ |
+    |  576 bits       | 32 bits | 512 bits  | ...     |
+    |  preamble       |   FSC   | codewords | batches |
+    | +++++++++++++++++++++++++++++++++++++++++++++++ |
+
+    where the preamble is "10" repeated 288 times. A sync is reported
+    when the register holds the FSC and the 576 bits right before it
+    were the preamble.
+
+    Since one bad bit in the preamble or FSC would throw away the whole
+    transmission, the detector can also accept an FSC within some
+    Hamming distance (popcount of register ^ FSC), and can skip the
+    preamble check and sync on the FSC alone.
+"""
+from pocsag_batch import FRAME_SYNC_CODE
+from pocsag_bch import POPCOUNT_16
+
+PREAMBLE_LEN = 576
+WORD_MASK = 0xFFFFFFFF
+
+
+class SyncDetector(object):
+    """
+        Streaming preamble + FSC detector
+
+        State is kept between calls to find() so bits can be fed
+        in as they arrive without re-scanning anything.
+
+        args:
+            preamble_len - (int) number of alternating bits needed before the FSC
+            max_errors - (int) number of bit errors allowed in the FSC
+            require_preamble - (bool) only sync on an FSC right after a preamble,
+                if False any FSC is a sync
+    """
+
+    def __init__(self, preamble_len=PREAMBLE_LEN, max_errors=0, require_preamble=True):
+        self.preamble_len = preamble_len
+        self.max_errors = max_errors
+        self.require_preamble = require_preamble
+        self.register = 0
+        self.unseen = 32
+        self.last_bit = -1
+        self.run = 0
+        self.since_preamble = -1
+        self.preambles = 0  # preambles seen
+        self.syncs = 0  # syncs found
+        self.reset()
+
+    def reset(self):
+        """
+            Forget every bit seen so far.
+            Use after jumping over bits that weren't fed in (ie decoded batches)
+        """
+        self.register = 0
+        # bits to feed before the register is full, no sync is reported
+        # until then so an FSC can't match on bits we haven't seen
+        self.unseen = 32
+        self.last_bit = -1  # so the first bit always starts a run
+        self.run = 0  # length of the alternating run ending at the last bit
+        self.since_preamble = -1  # bits since a full preamble ended, -1 if none
+
+    def find(self, bits, start=0, end=None):
+        """
+            Feed bits[start:end] through the detector until a sync is found
+
+            args:
+                bits - (int[]) of 0/1 bits, anything indexable works (list, bytearray)
+                start - (int) index of the first bit to feed
+                end - (int) index to stop at, defaults to len(bits)
+            returns:
+                (int) index in bits where the batch (its FSC) starts,
+                or None if every bit up to end was fed without a sync.
+                When a sync is found, bits up to the end of the FSC have been fed.
+                The index is negative if the FSC started in bits fed by an earlier call.
+        """
+        if end is None:
+            end = len(bits)
+
+        # pull state into locals, this is the hottest loop in the reader
+        reg = self.register
+        last = self.last_bit
+        run = self.run
+        since = self.since_preamble
+        preamble_len = self.preamble_len
+        max_errors = self.max_errors
+        require_preamble = self.require_preamble
+        preambles = 0
+        found = None
+        # first index where the register holds 32 bits that were fed
+        full_at = start + self.unseen - 1
+
+        idx = start
+        while idx < end:
+            bit = bits[idx]
+            reg = ((reg << 1) | bit) & WORD_MASK
+
+            if bit != last:
+                run += 1
+            else:
+                run = 1
+            last = bit
+
+            if since >= 0:
+                since += 1
+                if since > 32:
+                    since = -1
+
+            # preamble is "10" * 288 so it ends on a 0
+            if bit == 0 and run >= preamble_len:
+                # the run goes on matching every other bit, only count it once
+                if run < preamble_len + 2:
+                    preambles += 1
+                since = 0
+            elif since == 32 or not require_preamble:
+                diff = reg ^ FRAME_SYNC_CODE
+                if (diff == 0 or (max_errors and
+                                  POPCOUNT_16[diff & 0xFFFF] + POPCOUNT_16[diff >> 16] <= max_errors)) \
+                        and idx >= full_at:
+                    found = idx - 31
+                    break
+
+            idx += 1
+
+        fed = idx - start if found is None else idx - start + 1
+        self.unseen = max(self.unseen - fed, 0)
+        self.register = reg
+        self.last_bit = last
+        self.run = run
+        self.since_preamble = since
+        self.preambles += preambles
+        if found is not None:
+            self.syncs += 1
+        return found
@@ -0,0 +1,105 @@
+"""
+    Module with a fixed capacity ring buffer of bytes (one bit per byte)
+    used to hold the bits read from the UDP sink
+
+    The storage is preallocated and mirrored: data is 2 * capacity long
+    and every byte is written at pos and pos + capacity. That way the
+    live bytes are always one contiguous run in data starting at head,
+    so they can be sliced or scanned without wrapping around.
+
+    | ++++++++++++++++++++++++++++++++++++++++++++ |
+    | 0         head      head + len    2 * cap    |
+    | ...mirror | live bytes |  ...mirror          |
+    | ++++++++++++++++++++++++++++++++++++++++++++ |
+
+    Consuming just moves head, so it's O(1). If a write would go past
+    capacity, the oldest bytes are dropped and counted in self.dropped.
+"""
+
+
+class RingBuffer(object):
+    """
+        args:
+            capacity - (int) max number of bytes held at once
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = bytearray(2 * capacity)
+        self.head = 0  # index in data of the oldest byte, always < capacity
+        self.count = 0  # number of live bytes
+        self.dropped = 0  # bytes thrown away because the buffer was full
+        self.overflows = 0  # writes that had to drop bytes
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        """
+            Index or slice the live bytes, 0 is the oldest byte
+            Slices return a bytearray copy
+        """
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.count)
+            if step != 1:
+                raise ValueError("RingBuffer slices can't have a step")
+            stop = max(start, stop)
+            return self.data[self.head + start: self.head + stop]
+
+        if key < 0:
+            key += self.count
+        if key < 0 or key >= self.count:
+            raise IndexError("RingBuffer index out of range")
+        return self.data[self.head + key]
+
+    def write(self, chunk):
+        """
+            Add bytes to the end of the buffer
+            drops the oldest bytes if there isn't room
+
+            args:
+                chunk - (bytearray) bytes to add
+        """
+        size = len(chunk)
+        if size == 0:
+            return
+
+        if size > self.capacity:
+            # only the newest capacity bytes can fit
+            self.dropped += size - self.capacity
+            chunk = chunk[size - self.capacity:]
+            size = self.capacity
+
+        overflow = self.count + size - self.capacity
+        if overflow > 0:
+            self.overflows += 1
+            self.dropped += overflow
+            self.consume(overflow)
+
+        cap = self.capacity
+        pos = (self.head + self.count) % cap
+        first = min(size, cap - pos)
+        self.data[pos: pos + first] = chunk[:first]
+        self.data[pos + cap: pos + cap + first] = chunk[:first]
+
+        rest = size - first
+        if rest:
+            self.data[0: rest] = chunk[first:]
+            self.data[cap: cap + rest] = chunk[first:]
+
+        self.count += size
+
+    def consume(self, size):
+        """
+            Throw away the oldest bytes
+
+            args:
+                size - (int) number of bytes to remove, capped at len(self)
+        """
+        size = min(size, self.count)
+        self.head = (self.head + size) % self.capacity
+        self.count -= size
+
+    def clear(self):
+        """Throw away every byte"""
+        self.consume(self.count)
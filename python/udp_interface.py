@@ -2,24 +2,98 @@
     Module with functions to read from UDP Sink in GNURadio
     Will take the bits from the UDP sink, flip them 
     (since the high freq in the 2-FSK is binary 0 and GNURadio sets that to 1),
-    and return them as a string[] which can be added to buffer in pocsag_reader
+    and return them as an int[] of 0/1 bits which can be added to buffer in pocsag_reader
 
-    Will also implement array cleanup function in here since
-    the buffer would grow infinitely large and the same
-    data would be re-processed every loop
+    The bits are kept in a fixed size RingBuffer so memory stays flat
+    however long the reader runs. clean_buffer drops data that is no
+    longer useful, and if the buffer fills up anyway the oldest bits
+    are dropped and counted in buffer.dropped
 
-    TODO: look into just using a sizeable queue as data structure
+    Each read_socket call receives up to read_batch datagrams with
+    recv_into into one preallocated buffer, then flips all the bits
+    with a single translate instead of a python loop per byte
+
+    If the flow graph packs 8 bits per byte before the UDP sink, each
+    byte is looked up in a table of its 8 flipped bits instead, in
+    bit_order ("msb" if the first bit is the most significant, like
+    GNU Radio's unpacked_to_packed block with GR_MSB_FIRST)
+
+    The flow graph can also stream the float symbols from clock recovery
+    instead, then receive returns them as an array of floats for
+    pocsag_soft to decide and weigh
 """
+import errno
 import socket
+from array import array
+from ring_buffer import RingBuffer
+
+BUFFER_SIZE = 1 << 20  # bits, ~14 minutes at 1200 Bd
+READ_BATCH = 16  # max datagrams per read_socket call
+
+# maps every byte to byte ^ 1 so the 0/1 bits get flipped in bulk
+INVERT_TABLE = bytes(bytearray(i ^ 1 for i in range(256)))
+
+BIT_ORDERS = ["msb", "lsb"]
+SAMPLE_SIZE = array('f').itemsize  # bytes in a float32 sample
+
+# non blocking flag for the extra reads, not every platform has it
+DONTWAIT = getattr(socket, "MSG_DONTWAIT", None)
+
+
+def make_unpack_table(bit_order="msb"):
+    """
+        args:
+            bit_order - (str) one of BIT_ORDERS, where the first bit is in each byte
+        returns:
+            (str[]) of every byte -> its 8 flipped bits, one per byte
+    """
+    if bit_order not in BIT_ORDERS:
+        raise ValueError("unknown bit order %r" % bit_order)
+
+    shifts = range(7, -1, -1) if bit_order == "msb" else range(8)
+    return [bytes(bytearray(((byte >> shift) & 1) ^ 1 for shift in shifts))
+            for byte in range(256)]
+
+
+def unpack_bits(data, unpack_table):
+    """
+        Unpack and flip packed bits
+
+        args:
+            data - (str or bytearray) packed bytes
+            unpack_table - (str[]) from make_unpack_table
+        returns:
+            (bytearray) of the flipped bits, one per byte
+    """
+    return bytearray(b"".join([unpack_table[byte] for byte in bytearray(data)]))
+
+
+def to_samples(data):
+    """
+        args:
+            data - (str or bytearray) float32 samples in the machine's byte order
+        returns:
+            (array) of the samples, a trailing partial sample is dropped
+    """
+    samples = array('f')
+    samples.fromstring(bytes(data[:len(data) - len(data) % SAMPLE_SIZE]))
+    return samples
 
 
 class UdpInterface(object):
-    def __init__(self, addr, port, payload_size):
+    def __init__(self, addr, port, payload_size, buffer_size=BUFFER_SIZE, read_batch=READ_BATCH,
+                 packed=False, bit_order="msb", soft=False):
         self.addr = addr
         self.port = port
         self.payload_size = payload_size
+        self.read_batch = read_batch if DONTWAIT is not None else 1
+        # None when the datagrams are one bit per byte
+        self.unpack_table = make_unpack_table(bit_order) if packed else None
+        self.soft = soft  # datagrams are float32 symbols
         self.sock = self._make_conn()
-        self.buffer = []
+        self.buffer = RingBuffer(buffer_size)
+        self.recv_buffer = bytearray(payload_size * self.read_batch)
+        self.recv_view = memoryview(self.recv_buffer)
 
     def _make_conn(self):
         """
@@ -35,23 +109,48 @@ class UdpInterface(object):
         """
             read in data from socket to buffer
             will perform necessary bit flips here and make it
-            a string instead of bytes
+            an int per bit instead of bytes
+
+            returns:
+                (bool) True, there is always more data coming from the socket
         """
-        data, _ = self.sock.recvfrom(self.payload_size)
-        data = bytearray(data)
+        self.buffer.write(self.receive())
+        return True
 
-        for i in data:
-            bit = i ^ 1
-            self.buffer.append(str(bit))
+    def receive(self):
+        """
+            read in data from socket without touching the buffer
+
+            blocks until one datagram arrives, then takes up to
+            read_batch - 1 more if they are already waiting
+
+            returns:
+                (bytearray) of the flipped bits, one per byte,
+                or (array) of float samples if soft
+        """
+        size = self.payload_size
+        total = self.sock.recv_into(self.recv_view, size)
+
+        for _ in range(self.read_batch - 1):
+            try:
+                received = self.sock.recv_into(
+                    self.recv_view[total: total + size], size, DONTWAIT)
+            except socket.error as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            total += received
+
+        if self.soft:
+            return to_samples(self.recv_buffer[:total])
+        if self.unpack_table is not None:
+            return unpack_bits(self.recv_buffer[:total], self.unpack_table)
+        return bytearray(self.recv_buffer[:total].translate(INVERT_TABLE))
 
     def clean_buffer(self, last_idx):
         """
             remove data that is no longer useful in the buffer
-            will create a new buffer from curr_buffer[last_idx:]
-
-            may perform other actions eventually
+            everything before last_idx is dropped, so the old
+            buffer[last_idx] is buffer[0] after this
         """
-        # prev_len = len(self.buffer)
-        self.buffer = self.buffer[last_idx:]
-
-        # print "clean_buffer info", prev_len, len(self.buffer), last_idx
+        self.buffer.consume(last_idx)